@@ -1,12 +1,14 @@
 import json
+import logging
 import pprint
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 pd.set_option('display.max_rows', None)
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_colwidth', None)
 
+logger = logging.getLogger(__name__)
+
 
 def save_to_json(data, filename='output_data.json'):
     """
@@ -26,20 +28,33 @@ def save_to_json(data, filename='output_data.json'):
     with open(filename, 'w') as json_file:
         json.dump(data_dict, json_file, indent=4)
 
-    print(f"Data successfully saved to {filename}")
+    logger.info(f"Data successfully saved to {filename}")
 
 
 class Backtester:
-    def __init__(self, data, signals, hedge_ratio, alpha, initial_capital, transaction_cost):
+    def __init__(self, data, signals, hedge_ratio, alpha, initial_capital, transaction_cost, risk_engine=None):
         self.data = data.copy()
         self.signals = signals.copy()
+        # Scalars from OLS or per-bar Series from the Kalman filter
         self.hedge_ratio = hedge_ratio
         self.alpha = alpha
         self.initial_capital = initial_capital
         self.transaction_cost = transaction_cost
+        # Optional RiskEngine: enforces pre-trade limits, end-of-day flattening and the kill switch
+        self.risk_engine = risk_engine
         self.results = None
 
-    def run_backtest(self):
+    def run_backtest(self, engine='loop'):
+        """
+        Simulate the strategy bar by bar.
+
+        engine='loop' is the reference row-by-row implementation. engine='kernel' runs the same
+        accounting in Backtesting.kernels (JIT-compiled when numba is installed); it is used only
+        without a risk engine, since pre-trade checks need the per-bar Python state.
+        """
+        if engine == 'kernel' and self.risk_engine is None:
+            return self._run_backtest_kernel()
+
         # Copy data to avoid modifying the original DataFrame
         self.data = self.data.copy()
         self.data['positions'] = self.signals['positions']
@@ -58,6 +73,13 @@ class Backtester:
         current_num_shares_GLD = 0.0
         current_num_shares_GDX = 0.0
 
+        if isinstance(self.hedge_ratio, pd.Series):
+            hedge_ratios = self.hedge_ratio.reindex(self.data.index).to_numpy(dtype=float)
+        else:
+            hedge_ratios = np.broadcast_to(np.asarray(self.hedge_ratio, dtype=float), (len(self.data),))
+        bids_GLD, asks_GLD = self._execution_prices('GLD')
+        bids_GDX, asks_GDX = self._execution_prices('GDX')
+
         for i in range(len(self.data)):
             # Get the index (date) and current row
             index = self.data.index[i]
@@ -66,6 +88,10 @@ class Backtester:
             # Get current prices
             price_GLD = row['GLD']
             price_GDX = row['GDX']
+            hedge_ratio = hedge_ratios[i]
+            # Execution prices: sell at the bid, buy at the ask (both equal the price without quotes)
+            bid_GLD, ask_GLD = bids_GLD[i], asks_GLD[i]
+            bid_GDX, ask_GDX = bids_GDX[i], asks_GDX[i]
 
             # Get the position signal (1, 0, -1)
             position = row['positions']
@@ -76,24 +102,28 @@ class Backtester:
             else:
                 prev_position = 0
 
+            if self.risk_engine is not None:
+                self.risk_engine.on_price('GLD', price_GLD, index)
+                self.risk_engine.on_price('GDX', price_GDX, index)
+                # Flat into the close and after the kill switch, whatever the signal says
+                if self.risk_engine.should_flatten(index):
+                    position = 0
+
             if position != prev_position:
                 # Need to rebalance positions
                 # First, calculate proceeds from selling existing positions
-                proceeds_GLD = current_num_shares_GLD * price_GLD
-                proceeds_GDX = current_num_shares_GDX * price_GDX
-                current_cash += proceeds_GLD + proceeds_GDX
+                proceeds_GLD = current_num_shares_GLD * (bid_GLD if current_num_shares_GLD > 0 else ask_GLD)
+                proceeds_GDX = current_num_shares_GDX * (bid_GDX if current_num_shares_GDX > 0 else ask_GDX)
+                cash_after_close = current_cash + (proceeds_GLD + proceeds_GDX)
 
                 # Calculate transaction costs for selling
                 # transaction_costs = (abs(proceeds_GLD) + abs(proceeds_GDX)) * self.transaction_cost
-                transaction_costs = (abs(current_num_shares_GLD) + abs(current_num_shares_GDX)) * self.transaction_cost
-
-                current_cash -= transaction_costs
+                close_costs = (abs(current_num_shares_GLD) + abs(current_num_shares_GDX)) * self.transaction_cost
 
-                # Update transaction costs
-                self.data.at[index, 'transaction_costs'] += transaction_costs
+                cash_after_close -= close_costs
 
                 # Calculate new positions
-                capital_per_leg = current_cash / 2  # Allocate half of the cash to each leg
+                capital_per_leg = cash_after_close / 2  # Allocate half of the cash to each leg
 
                 # When position is +1: Long GLD, Short GDX
                 # When position is -1: Short GLD, Long GDX
@@ -101,19 +131,35 @@ class Backtester:
 
                 # Long GLD / Short GDX
                 if position == 1:
-                    num_shares_GLD = capital_per_leg / price_GLD
-                    num_shares_GDX = -(capital_per_leg / (price_GDX * self.hedge_ratio))
+                    num_shares_GLD = capital_per_leg / ask_GLD
+                    num_shares_GDX = -(capital_per_leg / (bid_GDX * hedge_ratio))
                 # Short GLD / Long GDX
                 elif position == -1:
-                    num_shares_GLD = -(capital_per_leg / price_GLD)
-                    num_shares_GDX = capital_per_leg / (price_GDX * self.hedge_ratio)
+                    num_shares_GLD = -(capital_per_leg / bid_GLD)
+                    num_shares_GDX = capital_per_leg / (ask_GDX * hedge_ratio)
                 else:
                     num_shares_GLD = 0.0
                     num_shares_GDX = 0.0
 
+                if self.risk_engine is not None:
+                    # Both legs are checked together, so the limits apply to the combined pair
+                    allowed, _ = self.risk_engine.pre_trade_check_legs(
+                        {'GLD': num_shares_GLD - current_num_shares_GLD, 'GDX': num_shares_GDX - current_num_shares_GDX},
+                        {'GLD': price_GLD, 'GDX': price_GDX}
+                    )
+                    if not allowed:
+                        # Rejected: keep the current holdings and remember the position actually held
+                        position = prev_position
+
+            if position != prev_position:
+                current_cash = cash_after_close
+
+                # Update transaction costs
+                self.data.at[index, 'transaction_costs'] += close_costs
+
                 # Calculate cost to buy new positions
-                cost_GLD = num_shares_GLD * price_GLD
-                cost_GDX = num_shares_GDX * price_GDX
+                cost_GLD = num_shares_GLD * (ask_GLD if num_shares_GLD > 0 else bid_GLD)
+                cost_GDX = num_shares_GDX * (ask_GDX if num_shares_GDX > 0 else bid_GDX)
 
                 # Calculate transaction costs for buying
                 # transaction_costs = (abs(cost_GLD) + abs(cost_GDX)) * self.transaction_cost
@@ -124,10 +170,25 @@ class Backtester:
                 # Update transaction costs
                 self.data.at[index, 'transaction_costs'] += transaction_costs
 
+                if self.risk_engine is not None:
+                    # Fills are booked at the mid price, the bid/ask spread paid counts as cost
+                    traded_GLD = num_shares_GLD - current_num_shares_GLD
+                    traded_GDX = num_shares_GDX - current_num_shares_GDX
+                    self.risk_engine.on_fill('GLD', traded_GLD, price_GLD,
+                                             (abs(current_num_shares_GLD) + abs(num_shares_GLD)) * self.transaction_cost
+                                             + (cost_GLD - proceeds_GLD) - traded_GLD * price_GLD)
+                    self.risk_engine.on_fill('GDX', traded_GDX, price_GDX,
+                                             (abs(current_num_shares_GDX) + abs(num_shares_GDX)) * self.transaction_cost
+                                             + (cost_GDX - proceeds_GDX) - traded_GDX * price_GDX)
+
                 # Update current positions
                 current_num_shares_GLD = num_shares_GLD
                 current_num_shares_GDX = num_shares_GDX
 
+            if self.risk_engine is not None:
+                # Record the position actually held so the next bar compares against it
+                self.data.at[index, 'positions'] = position
+
             # Update holdings value
             holdings = current_num_shares_GLD * price_GLD + current_num_shares_GDX * price_GDX
 
@@ -161,6 +222,50 @@ class Backtester:
 
         return self.results
 
+    def _execution_prices(self, symbol):
+        """
+        Bid and ask arrays for a symbol: the `{symbol}_bid` / `{symbol}_ask` columns when quote
+        data was loaded (the symbol column then holds the midpoint), else the price itself.
+        """
+        price = self.data[symbol].to_numpy(dtype=float)
+        bid_column, ask_column = f'{symbol}_bid', f'{symbol}_ask'
+        if bid_column in self.data.columns and ask_column in self.data.columns:
+            return self.data[bid_column].to_numpy(dtype=float), self.data[ask_column].to_numpy(dtype=float)
+        return price, price
+
+    def _run_backtest_kernel(self):
+        from Backtesting.kernels import run_accounting
+
+        self.data = self.data.copy()
+        self.data['positions'] = self.signals['positions']
+        if isinstance(self.hedge_ratio, pd.Series):
+            hedge_ratios = self.hedge_ratio.reindex(self.data.index).to_numpy(dtype=float)
+        else:
+            hedge_ratios = self.hedge_ratio
+
+        bids_GLD, asks_GLD = self._execution_prices('GLD')
+        bids_GDX, asks_GDX = self._execution_prices('GDX')
+        accounts = run_accounting(
+            self.data['GLD'], self.data['GDX'], self.data['positions'], hedge_ratios,
+            self.initial_capital, self.transaction_cost,
+            bid_gld=bids_GLD, ask_gld=asks_GLD, bid_gdx=bids_GDX, ask_gdx=asks_GDX
+        )
+        for column in ('num_shares_GLD', 'num_shares_GDX', 'cash', 'holdings', 'total_asset', 'transaction_costs'):
+            self.data[column] = accounts[column]
+        self.data['pnl'] = self.data['total_asset'].diff()
+        self.data.iloc[0, self.data.columns.get_loc('pnl')] = self.data['total_asset'].iloc[0] - self.initial_capital
+
+        # Calculate cumulative PnL and returns
+        self.data['cumulative_pnl'] = self.data['total_asset'] - self.initial_capital
+        self.data['returns'] = self.data['total_asset'].pct_change().fillna(0)
+
+        # Save results
+        self.results = self.data['total_asset']
+        self.positions = self.data['positions']
+        self.returns = self.data['returns']
+
+        return self.results
+
     def evaluate_minute_performance(self):
         total_minutes = len(self.data)
 
@@ -230,7 +335,31 @@ class Backtester:
             'Sharpe Ratio': sharpe_ratio
         }
 
+    def evaluate_robustness(self, bar_size='1 min', n_resamples=2000, block_size=None, confidence=0.95, seed=0, n_jobs=1):
+        """
+        Bootstrap / synthetic-path confidence intervals on Sharpe, drawdown and total return,
+        using the same per-bar risk-free rate as the evaluate_*_performance methods.
+        """
+        from Backtesting.robustness import robustness_analysis
+
+        risk_free_rate_annual = 0.02
+        if bar_size == '1 min':
+            risk_free_rate_per_bar = risk_free_rate_annual / (1440 * 365)
+        else:
+            risk_free_rate_per_bar = risk_free_rate_annual / 365
+
+        return robustness_analysis(
+            self.returns.to_numpy(),
+            risk_free_rate=risk_free_rate_per_bar,
+            n_resamples=n_resamples,
+            block_size=block_size,
+            confidence=confidence,
+            seed=seed,
+            n_jobs=n_jobs
+        )
+
     def plot_results(self):
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12, 6))
         plt.plot(self.results.index, self.results.values, label='Cumulative Net PnL')
         plt.title('Strategy Performance')
@@ -240,6 +369,7 @@ class Backtester:
         plt.show()
 
     def plot_positions(self):
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(12, 6))
         plt.plot(self.positions.index, self.positions.values, label='Position Holdings')
         plt.title('Position Holdings Over Time')
@@ -247,3 +377,50 @@ class Backtester:
         plt.ylabel('Number of Positions')
         plt.legend()
         plt.show()
+
+
+class BasketBacktester(Backtester):
+    """
+    Backtester for basket spreads (three or more legs). `weights` is a Series indexed by symbol
+    as returned by RegressionModel.basket_fit; the accounting runs as matrix-vector products in
+    Backtesting.kernels.run_basket_accounting. Bid/ask columns are used when present, like in
+    Backtester. The risk engine is not supported for baskets.
+    """
+    def __init__(self, data, signals, weights, alpha, initial_capital, transaction_cost):
+        super().__init__(data, signals, hedge_ratio=None, alpha=alpha, initial_capital=initial_capital, transaction_cost=transaction_cost)
+        self.weights = weights
+
+    def run_backtest(self, engine='kernel'):
+        from Backtesting.kernels import run_basket_accounting
+
+        self.data = self.data.copy()
+        self.data['positions'] = self.signals['positions']
+        symbols = list(self.weights.index)
+        quotes = [self._execution_prices(symbol) for symbol in symbols]
+
+        accounts = run_basket_accounting(
+            self.data[symbols].to_numpy(dtype=float),
+            self.data['positions'].to_numpy(dtype=float),
+            self.weights.to_numpy(dtype=float),
+            self.initial_capital,
+            self.transaction_cost,
+            bids=np.column_stack([bid for bid, _ in quotes]),
+            asks=np.column_stack([ask for _, ask in quotes])
+        )
+        for j, symbol in enumerate(symbols):
+            self.data[f'num_shares_{symbol}'] = accounts['shares'][:, j]
+        for column in ('cash', 'holdings', 'total_asset', 'transaction_costs'):
+            self.data[column] = accounts[column]
+        self.data['pnl'] = self.data['total_asset'].diff()
+        self.data.iloc[0, self.data.columns.get_loc('pnl')] = self.data['total_asset'].iloc[0] - self.initial_capital
+
+        # Calculate cumulative PnL and returns
+        self.data['cumulative_pnl'] = self.data['total_asset'] - self.initial_capital
+        self.data['returns'] = self.data['total_asset'].pct_change().fillna(0)
+
+        # Save results
+        self.results = self.data['total_asset']
+        self.positions = self.data['positions']
+        self.returns = self.data['returns']
+
+        return self.results
@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations, product
+
+import numpy as np
+import pandas as pd
+
+from Backtesting.kernels import run_accounting
+from RegressionModel.regression_model import RegressionModel
+
+
+def _train_indices(n_bars, test_blocks, purge, embargo):
+    """
+    All bars outside the test blocks, without the `purge` bars before and the `embargo` bars
+    after each block, so no training bar shares a rolling window with a test bar.
+    """
+    mask = np.ones(n_bars, dtype=bool)
+    for start, stop in test_blocks:
+        mask[max(0, start - purge):min(n_bars, stop + embargo)] = False
+    return np.flatnonzero(mask)
+
+
+def purged_kfold_splits(n_bars, n_splits=5, purge=0, embargo=0):
+    """
+    K contiguous test folds in time order, each trained on the purged and embargoed rest.
+
+    Returns:
+    --------
+    list of (np.ndarray, list of (int, int))
+        Training bar indices and the [start, stop) test blocks of every fold.
+    """
+    bounds = np.linspace(0, n_bars, n_splits + 1).astype(int)
+    splits = []
+    for k in range(n_splits):
+        blocks = [(bounds[k], bounds[k + 1])]
+        splits.append((_train_indices(n_bars, blocks, purge, embargo), blocks))
+    return splits
+
+
+def combinatorial_purged_splits(n_bars, n_groups=6, n_test_groups=2, purge=0, embargo=0):
+    """
+    Combinatorial purged cross-validation: the bars are cut into n_groups contiguous groups and
+    every combination of n_test_groups of them is a test set, trained on the purged rest.
+    Adjacent test groups are merged into one block.
+    """
+    bounds = np.linspace(0, n_bars, n_groups + 1).astype(int)
+    splits = []
+    for groups in combinations(range(n_groups), n_test_groups):
+        blocks = []
+        for group in groups:
+            start, stop = bounds[group], bounds[group + 1]
+            if blocks and blocks[-1][1] == start:
+                blocks[-1] = (blocks[-1][0], stop)
+            else:
+                blocks.append((start, stop))
+        splits.append((_train_indices(n_bars, blocks, purge, embargo), blocks))
+    return splits
+
+
+class CrossValidator:
+    """
+    Scores (window, z_threshold) parameter sets over time-series cross-validation folds of one
+    pair, `symbols` = (target, hedge).
+
+    Each test block is traded like the testing split in main.backtest: OLS hedge ratio fitted on
+    the fold's training bars, rolling z-score signals that start fresh in the block, and the
+    accounting kernel with the initial capital. Work that does not depend on the fold is done
+    once: the prices are aligned once, the rolling means, variances and covariance of the two
+    legs are computed once per window (the spread statistics for any hedge ratio follow from
+    them), and each fold's fit is shared by all parameter sets.
+    """
+    def __init__(self, data, initial_capital, transaction_cost, bar_size='1 min', symbols=('GLD', 'GDX')):
+        symbols = list(symbols)
+        if len(symbols) != 2:
+            raise ValueError(f"Cross-validation trades one pair, got {len(symbols)} symbols: {symbols}")
+        missing = [symbol for symbol in symbols if symbol not in data.columns]
+        if missing:
+            raise ValueError(f"Symbols {missing} are not in the data columns {list(data.columns)}")
+        self.symbols = symbols
+        # The pair code (RegressionModel, the GLD / GDX names below) calls the target leg GLD and the hedge leg GDX
+        self.data = data[symbols].dropna().set_axis(['GLD', 'GDX'], axis=1)
+        self.index = self.data.index
+        self.price_gld = self.data['GLD'].to_numpy(dtype=np.float64)
+        self.price_gdx = self.data['GDX'].to_numpy(dtype=np.float64)
+        self.initial_capital = initial_capital
+        self.transaction_cost = transaction_cost
+        risk_free_rate_annual = 0.02
+        self.risk_free_rate = risk_free_rate_annual / (1440 * 365) if bar_size == '1 min' else risk_free_rate_annual / 365
+        self._moments = {}
+
+    def rolling_moments(self, window):
+        """
+        Rolling means, variances and covariance of GLD and GDX over the whole history.
+        """
+        if window not in self._moments:
+            rolling_gld = self.data['GLD'].rolling(window)
+            rolling_gdx = self.data['GDX'].rolling(window)
+            self._moments[window] = (
+                rolling_gld.mean().to_numpy(),
+                rolling_gdx.mean().to_numpy(),
+                rolling_gld.var().to_numpy(),
+                rolling_gdx.var().to_numpy(),
+                rolling_gld.cov(self.data['GDX']).to_numpy(),
+            )
+        return self._moments[window]
+
+    def fit(self, train):
+        """
+        OLS hedge ratio and alpha on the training bars of a fold.
+        """
+        return RegressionModel(self.data.iloc[train]).linear_fit()
+
+    def positions(self, start, stop, window, z_threshold, hedge_ratio):
+        """
+        Signals of PairTradingStrategy.generate_signals run on bars [start, stop) only.
+        """
+        epsilon = 1e-8
+        mean_gld, mean_gdx, var_gld, var_gdx, cov = (moment[start:stop] for moment in self.rolling_moments(window))
+        deviation = (self.price_gld[start:stop] - mean_gld) - hedge_ratio * (self.price_gdx[start:stop] - mean_gdx)
+        variance = np.maximum(var_gld - 2 * hedge_ratio * cov + hedge_ratio ** 2 * var_gdx, 0.0)
+        std = np.sqrt(variance)
+        std[std == 0] = epsilon
+
+        with np.errstate(invalid='ignore'):
+            z_score = deviation / std
+        # The window has to lie inside the block, as if the block were traded on its own
+        z_score[:window - 1] = np.nan
+        positions = np.zeros(stop - start)
+        positions[z_score > z_threshold] = -1
+        positions[z_score < -z_threshold] = 1
+        return positions
+
+    def score(self, hedge_ratio, blocks, window, z_threshold):
+        """
+        Sharpe ratio, total return and trade count of one parameter set on the test blocks of
+        one fold. Bar returns of all test blocks are pooled for the Sharpe ratio.
+        """
+        returns = []
+        total_return = 0.0
+        trades = 0
+        for start, stop in blocks:
+            positions = self.positions(start, stop, window, z_threshold, hedge_ratio)
+            total_asset = run_accounting(
+                self.price_gld[start:stop], self.price_gdx[start:stop], positions, hedge_ratio,
+                self.initial_capital, self.transaction_cost
+            )['total_asset']
+            returns.append(np.r_[0.0, total_asset[1:] / total_asset[:-1] - 1])
+            total_return += total_asset[-1] - self.initial_capital
+            trades += int(np.count_nonzero(np.diff(np.r_[0.0, positions])))
+
+        returns = np.concatenate(returns)
+        std = returns.std(ddof=1)
+        return {
+            'Hedge Ratio': float(hedge_ratio),
+            'Test Bars': len(returns),
+            'Sharpe Ratio': float((returns.mean() - self.risk_free_rate) / std) if std > 0 else np.nan,
+            'Total Return ($)': float(total_return),
+            'Trades': trades,
+        }
+
+    def evaluate(self, splits, windows, z_thresholds, n_jobs=1):
+        """
+        Score every (window, z_threshold) on every split.
+
+        Returns:
+        --------
+        tuple of (pd.DataFrame, pd.DataFrame)
+            One row per parameter set and fold, and a summary per parameter set (mean, std and
+            worst fold Sharpe ratio) sorted by mean Sharpe ratio.
+        """
+        # Shared work first, so the threads only read it
+        for window in windows:
+            self.rolling_moments(window)
+        hedge_ratios = [self.fit(train)[0] for train, _ in splits]
+
+        jobs = [
+            (fold, window, z_threshold)
+            for (fold, _), window, z_threshold in product(enumerate(splits), windows, z_thresholds)
+        ]
+
+        def run(job):
+            fold, window, z_threshold = job
+            return dict(Fold=fold, Window=window, Threshold=z_threshold,
+                        **self.score(hedge_ratios[fold], splits[fold][1], window, z_threshold))
+
+        if n_jobs > 1:
+            # The accounting kernel releases the GIL, so threads share the precomputed arrays without copies
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                folds = pd.DataFrame(list(executor.map(run, jobs)))
+        else:
+            folds = pd.DataFrame([run(job) for job in jobs])
+
+        summary = folds.groupby(['Window', 'Threshold']).agg(
+            **{
+                'Mean Sharpe Ratio': ('Sharpe Ratio', 'mean'),
+                'Std Sharpe Ratio': ('Sharpe Ratio', 'std'),
+                'Worst Sharpe Ratio': ('Sharpe Ratio', 'min'),
+                'Mean Total Return ($)': ('Total Return ($)', 'mean'),
+                'Trades': ('Trades', 'sum'),
+            }
+        ).sort_values('Mean Sharpe Ratio', ascending=False).reset_index()
+        return folds, summary
@@ -0,0 +1,279 @@
+import time
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+
+def _accounting(price_gld, price_gdx, bid_gld, ask_gld, bid_gdx, ask_gdx, positions, hedge_ratios,
+                initial_capital, transaction_cost,
+                num_shares_gld, num_shares_gdx, cash, holdings, total_asset, transaction_costs):
+    """
+    Per-bar cash / holdings / share accounting of Backtester.run_backtest for one parameter set,
+    written over plain arrays so it can be JIT-compiled. Outputs are written into the given arrays.
+    Trades execute at the bid (sells) / ask (buys), holdings are marked at price_*.
+    """
+    current_cash = initial_capital
+    current_gld = 0.0
+    current_gdx = 0.0
+    prev_position = 0.0
+
+    for i in range(len(price_gld)):
+        p_gld = price_gld[i]
+        p_gdx = price_gdx[i]
+        position = positions[i]
+        costs = 0.0
+
+        if position != prev_position:
+            # Sell the existing legs
+            exit_gld = bid_gld[i] if current_gld > 0 else ask_gld[i]
+            exit_gdx = bid_gdx[i] if current_gdx > 0 else ask_gdx[i]
+            current_cash += current_gld * exit_gld + current_gdx * exit_gdx
+            close_costs = (abs(current_gld) + abs(current_gdx)) * transaction_cost
+            current_cash -= close_costs
+            costs += close_costs
+
+            # Buy the new legs with half of the cash each
+            capital_per_leg = current_cash / 2
+            if position == 1:
+                new_gld = capital_per_leg / ask_gld[i]
+                new_gdx = -(capital_per_leg / (bid_gdx[i] * hedge_ratios[i]))
+            elif position == -1:
+                new_gld = -(capital_per_leg / bid_gld[i])
+                new_gdx = capital_per_leg / (ask_gdx[i] * hedge_ratios[i])
+            else:
+                new_gld = 0.0
+                new_gdx = 0.0
+            open_costs = (abs(new_gld) + abs(new_gdx)) * transaction_cost
+            entry_gld = ask_gld[i] if new_gld > 0 else bid_gld[i]
+            entry_gdx = ask_gdx[i] if new_gdx > 0 else bid_gdx[i]
+            current_cash -= (new_gld * entry_gld + new_gdx * entry_gdx + open_costs)
+            costs += open_costs
+
+            current_gld = new_gld
+            current_gdx = new_gdx
+
+        num_shares_gld[i] = current_gld
+        num_shares_gdx[i] = current_gdx
+        cash[i] = current_cash
+        holdings[i] = current_gld * p_gld + current_gdx * p_gdx
+        total_asset[i] = current_cash + holdings[i]
+        transaction_costs[i] = costs
+        prev_position = position
+
+
+def _accounting_many(price_gld, price_gdx, positions, hedge_ratios, initial_capital, transaction_cost, total_asset):
+    """
+    Run _accounting for every row of `positions` / `hedge_ratios` (one row per parameter set).
+    """
+    n_sets, n_bars = positions.shape
+    for k in prange(n_sets):
+        scratch = np.empty((5, n_bars))
+        _accounting_jit(price_gld, price_gdx, price_gld, price_gld, price_gdx, price_gdx, positions[k], hedge_ratios[k],
+                        initial_capital, transaction_cost,
+                        scratch[0], scratch[1], scratch[2], scratch[3], total_asset[k], scratch[4])
+
+
+if NUMBA_AVAILABLE:
+    # nogil lets fold backtests run on threads, see Backtesting.cross_validation
+    _accounting_jit = njit(cache=True, nogil=True)(_accounting)
+    _accounting_many_jit = njit(parallel=True, cache=True)(_accounting_many)
+
+
+def _accounting_many_numpy(price_gld, price_gdx, positions, hedge_ratios, initial_capital, transaction_cost):
+    """
+    Pure-NumPy fallback: the time recursion stays a loop, but each step is vectorized
+    across all parameter sets, so many sets cost about as much as a few.
+    """
+    n_sets, n_bars = positions.shape
+    current_cash = np.full(n_sets, float(initial_capital))
+    current_gld = np.zeros(n_sets)
+    current_gdx = np.zeros(n_sets)
+    prev_position = np.zeros(n_sets)
+    total_asset = np.empty((n_sets, n_bars))
+
+    for i in range(n_bars):
+        p_gld = price_gld[i]
+        p_gdx = price_gdx[i]
+        position = positions[:, i]
+        change = position != prev_position
+
+        if change.any():
+            cash = current_cash + (current_gld * p_gld + current_gdx * p_gdx)
+            cash = cash - (np.abs(current_gld) + np.abs(current_gdx)) * transaction_cost
+            capital_per_leg = cash / 2
+            new_gld = position * (capital_per_leg / p_gld)
+            new_gdx = -position * (capital_per_leg / (p_gdx * hedge_ratios[:, i]))
+            cash = cash - (new_gld * p_gld + new_gdx * p_gdx + (np.abs(new_gld) + np.abs(new_gdx)) * transaction_cost)
+
+            current_cash = np.where(change, cash, current_cash)
+            current_gld = np.where(change, new_gld, current_gld)
+            current_gdx = np.where(change, new_gdx, current_gdx)
+
+        total_asset[:, i] = current_cash + (current_gld * p_gld + current_gdx * p_gdx)
+        prev_position = position
+
+    return total_asset
+
+
+def run_accounting(price_gld, price_gdx, positions, hedge_ratio, initial_capital, transaction_cost,
+                   bid_gld=None, ask_gld=None, bid_gdx=None, ask_gdx=None):
+    """
+    Accounting for a single parameter set. Uses the JIT kernel when numba is installed.
+    Bid/ask arrays default to the prices, i.e. execution at the bar price.
+
+    Returns:
+    --------
+    dict of np.ndarray
+        'num_shares_GLD', 'num_shares_GDX', 'cash', 'holdings', 'total_asset', 'transaction_costs'.
+    """
+    price_gld = np.ascontiguousarray(price_gld, dtype=np.float64)
+    price_gdx = np.ascontiguousarray(price_gdx, dtype=np.float64)
+    positions = np.ascontiguousarray(positions, dtype=np.float64)
+    hedge_ratios = np.ascontiguousarray(np.broadcast_to(np.asarray(hedge_ratio, dtype=np.float64), price_gld.shape))
+    quotes = [
+        price if quote is None else np.ascontiguousarray(quote, dtype=np.float64)
+        for quote, price in ((bid_gld, price_gld), (ask_gld, price_gld), (bid_gdx, price_gdx), (ask_gdx, price_gdx))
+    ]
+
+    outputs = np.empty((6, len(price_gld)))
+    kernel = _accounting_jit if NUMBA_AVAILABLE else _accounting
+    kernel(price_gld, price_gdx, *quotes, positions, hedge_ratios, float(initial_capital), float(transaction_cost), *outputs)
+    names = ('num_shares_GLD', 'num_shares_GDX', 'cash', 'holdings', 'total_asset', 'transaction_costs')
+    return dict(zip(names, outputs))
+
+
+def run_accounting_many(price_gld, price_gdx, positions, hedge_ratios, initial_capital, transaction_cost):
+    """
+    Accounting for many parameter sets over the same prices in one call.
+
+    Parameters:
+    -----------
+    positions : array-like of shape (n_sets, n_bars)
+        One row of 1 / 0 / -1 signals per parameter set.
+    hedge_ratios : float or array-like broadcastable to (n_sets, n_bars)
+
+    Returns:
+    --------
+    np.ndarray
+        total_asset of shape (n_sets, n_bars).
+    """
+    price_gld = np.ascontiguousarray(price_gld, dtype=np.float64)
+    price_gdx = np.ascontiguousarray(price_gdx, dtype=np.float64)
+    positions = np.ascontiguousarray(np.atleast_2d(positions), dtype=np.float64)
+    hedge_ratios = np.ascontiguousarray(np.broadcast_to(np.asarray(hedge_ratios, dtype=np.float64), positions.shape))
+
+    if NUMBA_AVAILABLE:
+        total_asset = np.empty(positions.shape)
+        _accounting_many_jit(price_gld, price_gdx, positions, hedge_ratios, float(initial_capital), float(transaction_cost), total_asset)
+        return total_asset
+    return _accounting_many_numpy(price_gld, price_gdx, positions, hedge_ratios, initial_capital, transaction_cost)
+
+
+def run_basket_accounting(prices, positions, weights, initial_capital, transaction_cost, bids=None, asks=None):
+    """
+    Accounting for a basket spread over an aligned (n_bars, n_legs) price matrix.
+
+    On every signal change the current legs are sold (at the bid for longs, ask for shorts) and
+    position * cash / (|weights| @ prices) units of the spread are bought, i.e. shares
+    proportional to the weights with a gross notional equal to the cash. Only the rebalance bars
+    are visited in Python, each as a few matrix-vector products; holdings and cash of all other
+    bars are forward-filled and marked with one row-wise product, so the cost per bar does not
+    depend on the number of legs.
+
+    Returns:
+    --------
+    dict of np.ndarray
+        'shares' (n_bars, n_legs), 'cash', 'holdings', 'total_asset', 'transaction_costs'.
+    """
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    bids = prices if bids is None else np.asarray(bids, dtype=np.float64)
+    asks = prices if asks is None else np.asarray(asks, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n_bars, n_legs = prices.shape
+
+    previous = np.concatenate([[0.0], positions[:-1]])
+    changes = np.flatnonzero(positions != previous)
+    shares_at = np.zeros((len(changes) + 1, n_legs))
+    cash_at = np.full(len(changes) + 1, float(initial_capital))
+    transaction_costs = np.zeros(n_bars)
+
+    cash = float(initial_capital)
+    shares = np.zeros(n_legs)
+    gross_weights = np.abs(weights)
+    for k, i in enumerate(changes, start=1):
+        cash += shares @ np.where(shares > 0, bids[i], asks[i])
+        close_costs = np.abs(shares).sum() * transaction_cost
+        cash -= close_costs
+
+        units = positions[i] * cash / (gross_weights @ prices[i])
+        shares = units * weights
+        open_costs = np.abs(shares).sum() * transaction_cost
+        cash -= shares @ np.where(shares > 0, asks[i], bids[i]) + open_costs
+
+        transaction_costs[i] = close_costs + open_costs
+        shares_at[k] = shares
+        cash_at[k] = cash
+
+    # Segment 0 is the flat start, segment k starts at the k-th rebalance
+    segment = np.searchsorted(changes, np.arange(n_bars), side='right')
+    held_shares = shares_at[segment]
+    holdings = np.einsum('ij,ij->i', held_shares, prices)
+    cash_series = cash_at[segment]
+    return {
+        'shares': held_shares,
+        'cash': cash_series,
+        'holdings': holdings,
+        'total_asset': cash_series + holdings,
+        'transaction_costs': transaction_costs,
+    }
+
+
+if __name__ == "__main__":
+    # Parity against the reference pandas loop, and bars/sec for each backend
+    import pandas as pd
+
+    from Backtesting.backtesting import Backtester
+    from Strategy.strategy import PairTradingStrategy
+
+    data = pd.concat([
+        pd.read_json(f'Data/commodity_data/{symbol}_1min.json', orient='index') for symbol in ('GLD', 'GDX')
+    ], axis=1).dropna()
+    data.index = pd.to_datetime(data.index)
+    testing = data.iloc[-20000:]
+    hedge_ratio, alpha = 1.5, 3.0
+    signals = PairTradingStrategy(testing, hedge_ratio, alpha, z_threshold=1.5, window=30).generate_signals()
+
+    backtester = Backtester(testing, signals, hedge_ratio, alpha, initial_capital=100000, transaction_cost=0.0035)
+    start = time.perf_counter()
+    reference = backtester.run_backtest().to_numpy()
+    elapsed = time.perf_counter() - start
+    print(f"pandas loop: {len(testing) / elapsed:,.0f} bars/sec")
+
+    kernel = run_accounting(testing['GLD'], testing['GDX'], signals['positions'], hedge_ratio, 100000, 0.0035)
+    start = time.perf_counter()
+    kernel = run_accounting(testing['GLD'], testing['GDX'], signals['positions'], hedge_ratio, 100000, 0.0035)
+    elapsed = time.perf_counter() - start
+    print(f"kernel ({'numba' if NUMBA_AVAILABLE else 'python'}): {len(testing) / elapsed:,.0f} bars/sec, "
+          f"max abs diff {np.abs(kernel['total_asset'] - reference).max():.3e}")
+
+    windows = np.arange(5, 205, 5)
+    positions = np.vstack([
+        PairTradingStrategy(testing, hedge_ratio, alpha, z_threshold=1.5, window=int(w)).generate_signals()['positions'].to_numpy()
+        for w in windows
+    ])
+    run_accounting_many(testing['GLD'], testing['GDX'], positions[:1], hedge_ratio, 100000, 0.0035)
+    start = time.perf_counter()
+    many = run_accounting_many(testing['GLD'], testing['GDX'], positions, hedge_ratio, 100000, 0.0035)
+    elapsed = time.perf_counter() - start
+    print(f"{len(windows)} parameter sets: {positions.size / elapsed:,.0f} bars/sec")
+
+    numpy_many = _accounting_many_numpy(testing['GLD'].to_numpy(), testing['GDX'].to_numpy(), positions,
+                                        np.full(positions.shape, hedge_ratio), 100000, 0.0035)
+    print(f"numpy fallback max abs diff {np.abs(numpy_many - many).max():.3e}")
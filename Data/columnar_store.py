@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+# Column dtypes per dataset: prices as float32, sizes as int32, timestamps as int64 nanoseconds
+SCHEMAS = {
+    'bid_ask_bars': {'bid': np.float32, 'ask': np.float32},
+    'midpoint_bars': {'mid': np.float32},
+    'bid_ask_ticks': {'bid': np.float32, 'ask': np.float32, 'bid_size': np.int32, 'ask_size': np.int32},
+    'trade_ticks': {'price': np.float32, 'size': np.int32},
+}
+
+# float32 keeps ~7 significant digits; prices are rounded back to this many decimals when read
+PRICE_DECIMALS = 4
+
+
+class ColumnarStore:
+    """
+    Compact on-disk storage for quote bars and ticks, partitioned by day:
+
+        {root}/{symbol}/{dataset}/{YYYY-MM-DD}/timestamp.npy, bid.npy, ask.npy, ...
+
+    Each column is a plain .npy file, so a partition can be memory-mapped and only the
+    requested columns of the requested days are ever read.
+    """
+    def __init__(self, root='Data/quote_data/'):
+        self.root = root
+
+    def _dataset_dir(self, symbol, dataset):
+        return os.path.join(self.root, symbol, dataset)
+
+    def _partition_dir(self, symbol, dataset, day):
+        return os.path.join(self._dataset_dir(symbol, dataset), day.isoformat())
+
+    def partitions(self, symbol, dataset):
+        """
+        Sorted list of days that have a partition (possibly empty, for days without data).
+        """
+        directory = self._dataset_dir(symbol, dataset)
+        if not os.path.exists(directory):
+            return []
+        return sorted(date.fromisoformat(name) for name in os.listdir(directory) if not name.endswith('.tmp'))
+
+    def missing_days(self, symbol, dataset, start_date, end_date):
+        """
+        Weekdays in [start_date, end_date] without a partition. Today is always reported
+        as missing, because its partition may still be incomplete.
+        """
+        stored = set(self.partitions(symbol, dataset))
+        today = date.today()
+        days = pd.bdate_range(start_date.date(), end_date.date()).date
+        return [day for day in days if day not in stored or day >= today]
+
+    def write(self, symbol, dataset, frame, days=None):
+        """
+        Store a DataFrame indexed by timestamp, one partition per day. Existing partitions
+        of those days are replaced. Days listed in `days` but absent from `frame` get an
+        empty partition, so they are not fetched again.
+        """
+        schema = SCHEMAS[dataset]
+        frame = frame.sort_index()
+        timestamps = frame.index.as_unit('ns').asi8 if len(frame) else np.array([], dtype=np.int64)
+        frame_days = frame.index.normalize() if len(frame) else pd.DatetimeIndex([])
+
+        all_days = set(frame_days.date) | set(days or [])
+        for day in sorted(all_days):
+            mask = frame_days == pd.Timestamp(day) if len(frame) else np.array([], dtype=bool)
+            directory = self._partition_dir(symbol, dataset, day)
+            staging = directory + '.tmp'
+            if os.path.exists(staging):
+                shutil.rmtree(staging)
+            os.makedirs(staging)
+
+            np.save(os.path.join(staging, 'timestamp.npy'), timestamps[mask].astype(np.int64))
+            for column, dtype in schema.items():
+                values = frame[column].to_numpy()[mask] if len(frame) else np.array([])
+                np.save(os.path.join(staging, f'{column}.npy'), values.astype(dtype))
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({'rows': int(mask.sum()) if len(frame) else 0, 'schema': {c: np.dtype(t).name for c, t in schema.items()}}, f)
+
+            # Swap in the new partition in one rename, so readers never see half a partition
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+            os.rename(staging, directory)
+
+    def iter_partitions(self, symbol, dataset, start_date, end_date, columns=None):
+        """
+        Yield (day, {column: array}) for each stored day in range. Arrays are memory-mapped
+        and still in their compact dtypes; timestamps are int64 nanoseconds.
+        """
+        columns = list(SCHEMAS[dataset]) if columns is None else list(columns)
+        start_ns = pd.Timestamp(start_date).value
+        end_ns = pd.Timestamp(end_date).value
+        for day in self.partitions(symbol, dataset):
+            if day < start_date.date() or day > end_date.date():
+                continue
+            directory = self._partition_dir(symbol, dataset, day)
+            timestamps = np.load(os.path.join(directory, 'timestamp.npy'), mmap_mode='r')
+            if len(timestamps) == 0:
+                continue
+            lo = np.searchsorted(timestamps, start_ns, side='left')
+            hi = np.searchsorted(timestamps, end_ns, side='right')
+            if lo >= hi:
+                continue
+            arrays = {'timestamp': timestamps[lo:hi]}
+            for column in columns:
+                arrays[column] = np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r')[lo:hi]
+            yield day, arrays
+
+    def read(self, symbol, dataset, start_date, end_date, columns=None):
+        """
+        Read a date range into a DataFrame indexed by timestamp. Prices are returned as
+        float64 rounded to PRICE_DECIMALS, sizes keep their int32 dtype.
+        """
+        schema = SCHEMAS[dataset]
+        columns = list(schema) if columns is None else list(columns)
+        chunks = list(self.iter_partitions(symbol, dataset, start_date, end_date, columns))
+        if not chunks:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='date'))
+
+        index = pd.DatetimeIndex(np.concatenate([arrays['timestamp'] for _, arrays in chunks]).astype('datetime64[ns]'), name='date')
+        data = {}
+        for column in columns:
+            values = np.concatenate([arrays[column] for _, arrays in chunks])
+            if np.issubdtype(schema[column], np.floating):
+                values = np.round(values.astype(np.float64), PRICE_DECIMALS)
+            data[column] = values
+        return pd.DataFrame(data, index=index)
+
+
+def ticks_to_quote_bars(store, symbol, start_date, end_date, freq='1min'):
+    """
+    Last bid/ask of each bar from stored bid/ask ticks, one day at a time so that
+    months of ticks never have to be in memory at once.
+    """
+    frames = []
+    for _, arrays in store.iter_partitions(symbol, 'bid_ask_ticks', start_date, end_date, columns=('bid', 'ask')):
+        ticks = pd.DataFrame(
+            {'bid': arrays['bid'].astype(np.float64), 'ask': arrays['ask'].astype(np.float64)},
+            index=pd.DatetimeIndex(np.asarray(arrays['timestamp']).astype('datetime64[ns]'))
+        )
+        frames.append(ticks.resample(freq, label='left').last().dropna().round(PRICE_DECIMALS))
+    if not frames:
+        return pd.DataFrame(columns=['bid', 'ask'])
+    return pd.concat(frames)
@@ -1,14 +1,34 @@
+import logging
 import pprint
 
-from ib_insync import *
 import pandas as pd
 import numpy as np
 import time
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import os
 import json
 
-from Data.utils import load_data_from_json, save_data_to_json, adjust_to_trading_hours
+from Data.utils import load_data_from_json, adjust_to_trading_hours
+from Data.columnar_store import ColumnarStore, SCHEMAS
+from Data.partitioned_store import PartitionedBarStore
+from Utils.profiling import NullProfiler
+from Utils.log_utils import count
+
+logger = logging.getLogger(__name__)
+
+
+# Bars and the 09:30-16:00 session are in exchange time; used when the contract has no timeZoneId
+EXCHANGE_TIMEZONE = 'America/New_York'
+
+
+def _exchange_naive(timestamp, timezone):
+    """
+    IB tick times are timezone-aware UTC; the cache stores naive exchange-time timestamps like the bars.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(ZoneInfo(timezone)).replace(tzinfo=None)
 
 
 class DataLoader:
@@ -18,11 +38,17 @@ class DataLoader:
     Now includes functionality to save data to and load data from local JSON files.
     """
 
-    def __init__(self, ib_port=7497, client_id=1, data_dir='Data/commodity_data/'):
+    def __init__(self, ib_port=7497, client_id=1, data_dir='Data/commodity_data/', profiler=None, quote_dir='Data/quote_data/', bar_dir='Data/bar_data/'):
         self.ib_port = ib_port
         self.client_id = client_id
         self.ib = None
         self.data_dir = data_dir
+        # Optional Utils.profiling.StageProfiler timing cache loads and IB fetches
+        self.profiler = profiler or NullProfiler()
+        # Day-partitioned float32/int32 storage for BID_ASK / MIDPOINT bars and ticks
+        self.quote_store = ColumnarStore(quote_dir)
+        # Month-partitioned TRADES bars; the JSON files in data_dir are only read to seed it
+        self.bar_store = PartitionedBarStore(bar_dir)
         # Create data directory if it doesn't exist
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
@@ -32,6 +58,8 @@ class DataLoader:
         Establishes connection to the IB API.
         """
         if not self.ib or not self.ib.isConnected():
+            # ib_insync is only needed when talking to IB, keep it off the offline import path
+            from ib_insync import IB
             self.ib = IB()
             self.ib.connect('127.0.0.1', self.ib_port, clientId=self.client_id)
 
@@ -56,39 +84,228 @@ class DataLoader:
         Uses local cache if available, fetches missing data from IB API if needed.
         """
         start_date, end_date = adjust_to_trading_hours(start_date, end_date)
+        data = self.read_cache(symbol, start_date, end_date, bar_size)
+        if data is not None:
+            return data
+
+        count(logger, 'cache_misses', f"Fetching new data for {symbol} from {start_date} to {end_date}.", symbol=symbol)
+        with self.profiler.stage(f'ib fetch {symbol}') as stage:
+            new_data = self.fetch_new_data(symbol, start_date, end_date, bar_size, what_to_show, use_rth)
+            stage.rows = len(new_data)
+        return self.write_cache(new_data, symbol, start_date, end_date, bar_size)
 
-        filepath = self.get_data_filename(symbol, bar_size)
-        cached_data = load_data_from_json(filepath)
+    async def fetch_data_async(self, ib, symbol, start_date, end_date, bar_size='1 min', what_to_show='TRADES', use_rth=True):
+        """
+        fetch_data for code running inside an event loop on an already connected ib_insync IB.
+        Missing history is requested with reqHistoricalDataAsync on that connection, so no
+        second client (with the same clientId) is opened and the loop is not blocked meanwhile.
+        """
+        start_date, end_date = adjust_to_trading_hours(start_date, end_date)
+        data = self.read_cache(symbol, start_date, end_date, bar_size)
+        if data is not None:
+            return data
+
+        from ib_insync import Stock, util
+
+        count(logger, 'cache_misses', f"Fetching new data for {symbol} from {start_date} to {end_date}.", symbol=symbol)
+        max_days = 30 if bar_size == '1 min' else 365
+        contract = Stock(symbol, 'SMART', 'USD')
+        await ib.qualifyContractsAsync(contract)
+
+        data_frames = []
+        current_end_date = end_date
+        while current_end_date > start_date:
+            # Whole days, IB only takes durations of at least one day
+            days = min(max(int(np.ceil((current_end_date - start_date) / timedelta(days=1))), 1), max_days)
+            bars = await ib.reqHistoricalDataAsync(
+                contract, endDateTime=current_end_date.strftime('%Y%m%d %H:%M:%S'), durationStr=f'{days} D',
+                barSizeSetting=bar_size, whatToShow=what_to_show, useRTH=use_rth, formatDate=1
+            )
+            if not bars:
+                logger.warning(f"No data returned for {symbol} ending at {current_end_date}.")
+                break
+            df = util.df(bars)
+            df['date'] = pd.to_datetime(df['date']).dt.tz_localize(None)
+            df = df.set_index('date')[['close']].rename(columns={'close': symbol})
+            data_frames.append(df)
+            current_end_date = df.index.min() - timedelta(seconds=1)
+            count(logger, 'bars_fetched', f"Fetched {len(df)} records. Next end_date: {current_end_date}", value=len(df), symbol=symbol)
+
+        new_data = pd.concat(data_frames).sort_index() if data_frames else pd.DataFrame()
+        if not new_data.empty:
+            new_data = new_data[(new_data.index >= start_date) & (new_data.index <= end_date)]
+        return self.write_cache(new_data, symbol, start_date, end_date, bar_size)
+
+    def read_cache(self, symbol, start_date, end_date, bar_size='1 min'):
+        """
+        Cached bars of the range if the bar store covers all of it, else None.
+        """
+        dataset = bar_size.replace(' ', '')
+        with self.profiler.stage(f'cache load {symbol}') as stage:
+            coverage = self.bar_store.coverage(symbol, dataset)
+            if coverage is None:
+                coverage = self.import_json_cache(symbol, bar_size)
+
+            if coverage is not None and coverage[0] <= start_date and coverage[1] >= end_date:
+                data = self.bar_store.read(symbol, dataset, start_date, end_date)
+                stage.rows = len(data)
+                count(logger, 'cache_hits', f"Returning cached data for {symbol} from {start_date} to {end_date}.", symbol=symbol)
+                return data
+        return None
+
+    def write_cache(self, new_data, symbol, start_date, end_date, bar_size='1 min'):
+        """
+        Merge fetched bars into the bar store and return the stored bars of the range.
+        """
+        dataset = bar_size.replace(' ', '')
+        with self.profiler.stage(f'cache write {symbol}') as stage:
+            # Only the months covered by the new bars are rewritten
+            self.bar_store.write(new_data, symbol, dataset)
+            stage.rows = len(new_data)
 
-        if cached_data is not None:
-            # Get cached data range
-            cached_start = cached_data.index.min()
-            cached_end = cached_data.index.max()
+        return self.bar_store.read(symbol, dataset, start_date, end_date)
 
-            if cached_start <= start_date and cached_end >= end_date:
-                print(f"Returning cached data for {symbol} from {start_date} to {end_date}.")
-                return cached_data[(cached_data.index >= start_date) & (cached_data.index <= end_date)]
+    def import_json_cache(self, symbol, bar_size):
+        """
+        Move a monolithic JSON cache file of a symbol into the partitioned bar store, once.
+        Returns the stored (first, last) timestamps, or None if there is no JSON cache.
+        """
+        cached_data = load_data_from_json(self.get_data_filename(symbol, bar_size))
+        if cached_data is None or cached_data.empty:
+            return None
+        dataset = bar_size.replace(' ', '')
+        self.bar_store.write(cached_data, symbol, dataset)
+        count(logger, 'cache_imports', f"Partitioned the JSON cache of {symbol} {bar_size} into {self.bar_store.root}.",
+              symbol=symbol, rows=len(cached_data))
+        return self.bar_store.coverage(symbol, dataset)
+
+    def fetch_quotes(self, symbol, start_date, end_date, bar_size='1 min', use_rth=True):
+        """
+        Quote bars for the date range from the columnar store, fetching BID_ASK and MIDPOINT
+        history from IB for the days not stored yet.
 
-        print(f"Fetching new data for {symbol} from {start_date} to {end_date}.")
-        new_data = self.fetch_new_data(symbol, start_date, end_date, bar_size, what_to_show, use_rth)
+        Returns a DataFrame with the midpoint under the symbol name (so the strategy computes
+        the spread from midpoints) and `{symbol}_bid` / `{symbol}_ask` for execution.
+        """
+        start_date, end_date = adjust_to_trading_hours(start_date, end_date)
 
-        if cached_data is not None:
-            cached_data = pd.concat([cached_data, new_data])
-            cached_data = cached_data[~cached_data.index.duplicated(keep='last')]
-            cached_data.sort_index(inplace=True)
-        else:
-            cached_data = new_data
+        for dataset, what_to_show in (('bid_ask_bars', 'BID_ASK'), ('midpoint_bars', 'MIDPOINT')):
+            missing = self.quote_store.missing_days(symbol, dataset, start_date, end_date)
+            if not missing:
+                continue
+            # Whole days, 'N D' back from the close of the last missing day, so a single missing
+            # day is still a full one-day request
+            fetch_end = min(datetime.combine(missing[-1], datetime.min.time()).replace(hour=16), datetime.now())
+            fetch_start = fetch_end - timedelta(days=(missing[-1] - missing[0]).days + 1)
+            with self.profiler.stage(f'ib fetch {symbol} {what_to_show}') as stage:
+                bars = self.fetch_new_data(symbol, fetch_start, fetch_end, bar_size, what_to_show, use_rth, raw=True)
+                stage.rows = len(bars)
+            # Stored days outside the missing ones are left as they are
+            bars = bars[np.isin(bars.index.date, missing)] if not bars.empty else bars
+            if bars.empty:
+                continue
+            if what_to_show == 'BID_ASK':
+                frame = pd.DataFrame({'bid': bars['open'], 'ask': bars['close']})
+            else:
+                frame = pd.DataFrame({'mid': bars['close']})
+            # Days without bars (holidays) get empty partitions, but only inside the range IB
+            # returned; days before or after it were not covered and are fetched again next time
+            first_day, last_day = bars.index.min().date(), bars.index.max().date()
+            completed = [day for day in missing if first_day <= day <= last_day and day < datetime.now().date()]
+            self.quote_store.write(symbol, dataset, frame, days=completed)
+
+        with self.profiler.stage(f'quote load {symbol}') as stage:
+            quotes = self.quote_store.read(symbol, 'bid_ask_bars', start_date, end_date)
+            mid = self.quote_store.read(symbol, 'midpoint_bars', start_date, end_date)
+            data = pd.DataFrame({
+                symbol: mid['mid'],
+                f'{symbol}_bid': quotes['bid'],
+                f'{symbol}_ask': quotes['ask'],
+            }).dropna()
+            stage.rows = len(data)
+        return data
+
+    def fetch_ticks(self, symbol, start_date, end_date, what_to_show='BID_ASK', use_rth=True, max_requests_per_day=2000):
+        """
+        Stores historical ticks ('BID_ASK' or 'TRADES') for every missing day in the range,
+        one day partition at a time. Read them back with quote_store.iter_partitions / read,
+        or aggregate them to quote bars with Data.columnar_store.ticks_to_quote_bars.
+        """
+        from ib_insync import Stock
 
-        save_data_to_json(cached_data, filepath)
+        dataset = 'bid_ask_ticks' if what_to_show == 'BID_ASK' else 'trade_ticks'
+        start_date, end_date = adjust_to_trading_hours(start_date, end_date)
+        missing = self.quote_store.missing_days(symbol, dataset, start_date, end_date)
+        if not missing:
+            return dataset
 
-        return cached_data[(cached_data.index >= start_date) & (cached_data.index <= end_date)]
+        try:
+            self.connect()
+            contract = Stock(symbol, 'SMART', 'USD')
+            self.ib.qualifyContracts(contract)
+            details = self.ib.reqContractDetails(contract)
+            timezone = (details[0].timeZoneId if details else None) or EXCHANGE_TIMEZONE
+
+            for day in missing:
+                day_start = datetime.combine(day, datetime.min.time()).replace(hour=9, minute=30)
+                day_end = datetime.combine(day, datetime.min.time()).replace(hour=16)
+                rows = []
+                cursor = day_start
+                # Ticks at `cursor` already stored from the previous page
+                skip = 0
+                # IB returns at most 1000 ticks per request, page forward from the last tick time
+                for _ in range(max_requests_per_day):
+                    ticks = self.ib.reqHistoricalTicks(
+                        contract, startDateTime=f"{cursor:%Y%m%d %H:%M:%S} {timezone}", endDateTime='',
+                        numberOfTicks=1000, whatToShow=what_to_show, useRth=use_rth
+                    )
+                    if not ticks:
+                        break
+                    timestamps = [_exchange_naive(tick.time, timezone) for tick in ticks]
+                    for timestamp, tick in zip(timestamps, ticks):
+                        if timestamp == cursor and skip:
+                            skip -= 1
+                            continue
+                        if timestamp > day_end:
+                            break
+                        if what_to_show == 'BID_ASK':
+                            rows.append((timestamp, tick.priceBid, tick.priceAsk, tick.sizeBid, tick.sizeAsk))
+                        else:
+                            rows.append((timestamp, tick.price, tick.size))
+                    last = timestamps[-1]
+                    if last >= day_end or len(ticks) < 1000:
+                        break
+                    if last == cursor:
+                        # A whole page inside one second, asking again from it returns the same page
+                        logger.warning(f"More than {len(ticks)} {what_to_show} ticks for {symbol} at {last}, "
+                                       f"the rest of that second is skipped.")
+                        cursor, skip = last + timedelta(seconds=1), 0
+                        continue
+                    # Ticks have one-second timestamps and a page can end inside a second: restart at
+                    # that second and skip the ticks of it this page already returned
+                    cursor, skip = last, timestamps.count(last)
+
+                columns = ['date'] + list(SCHEMAS[dataset])
+                frame = pd.DataFrame(rows, columns=columns).set_index('date')
+                count(logger, 'ticks_fetched', f"Fetched {len(frame)} {what_to_show} ticks for {symbol} on {day}",
+                      value=len(frame), symbol=symbol)
+                if day < datetime.now().date():
+                    self.quote_store.write(symbol, dataset, frame, days=[day])
+                time.sleep(1)
+        finally:
+            self.disconnect()
+        return dataset
 
     # The existing fetch_data method you provided
-    def fetch_new_data(self, symbol, start_date, end_date, bar_size='1 min', what_to_show='TRADES', use_rth=True):
+    def fetch_new_data(self, symbol, start_date, end_date, bar_size='1 min', what_to_show='TRADES', use_rth=True, raw=False):
         """
         Fetches historical price data for the specified symbol and date range.
         Now checks for local JSON file before fetching.
+        With raw=True the open/high/low/close columns are kept under their IB names,
+        which is needed for BID_ASK bars (open = average bid, close = average ask).
         """
+        from ib_insync import Stock, util
+
         try:
             self.connect()
 
@@ -117,7 +334,7 @@ class DataLoader:
                 fetch_duration = min(remaining_duration, max_duration)
 
                 if fetch_duration.days < 1:
-                    print(f"Fetch duration less than 1 day for {symbol}. Ending data fetch.")
+                    logger.info(f"Fetch duration less than 1 day for {symbol}. Ending data fetch.")
                     break
 
                 duration_str = duration_str_template.format(fetch_duration.days)
@@ -125,7 +342,7 @@ class DataLoader:
                 # Format the endDateTime as required by IB API (YYYYMMDD HH:MM:SS)
                 end_datetime_str = current_end_date.strftime('%Y%m%d %H:%M:%S')
 
-                print(f"Fetching data for {symbol} from {end_datetime_str} back {duration_str}.")
+                logger.info(f"Fetching data for {symbol} from {end_datetime_str} back {duration_str}.")
 
                 # Request historical data
                 bars = self.ib.reqHistoricalData(
@@ -140,15 +357,18 @@ class DataLoader:
                 )
 
                 if not bars:
-                    print(f"No data returned for {symbol} ending at {current_end_date}.")
+                    logger.warning(f"No data returned for {symbol} ending at {current_end_date}.")
                     break
 
                 # Convert bars to DataFrame
                 df = util.df(bars)
                 df['date'] = pd.to_datetime(df['date']).dt.tz_localize(None)  # Remove timezone info
                 df.set_index('date', inplace=True)
-                df = df[['close']]
-                df.rename(columns={'close': symbol}, inplace=True)
+                if raw:
+                    df = df[['open', 'high', 'low', 'close']]
+                else:
+                    df = df[['close']]
+                    df.rename(columns={'close': symbol}, inplace=True)
 
                 # Append to list
                 data_frames.append(df)
@@ -158,7 +378,7 @@ class DataLoader:
                 earliest_date = earliest_date.replace(tzinfo=None)  # Ensure timezone-naive
                 current_end_date = earliest_date - timedelta(seconds=1)
 
-                print(f"Fetched {len(df)} records. Next end_date: {current_end_date}")
+                count(logger, 'bars_fetched', f"Fetched {len(df)} records. Next end_date: {current_end_date}", value=len(df), symbol=symbol)
 
                 # Sleep to comply with rate limits
                 time.sleep(sleep_interval)
@@ -169,15 +389,15 @@ class DataLoader:
                 data.sort_index(inplace=True)
                 # Filter data within the start_date and end_date
                 data = data[(data.index >= start_date) & (data.index <= end_date)]
-                print(f"Total records fetched for {symbol}: {len(data)}")
+                logger.info(f"Total records fetched for {symbol}: {len(data)}")
             else:
-                print(f"No data fetched for symbol {symbol}")
+                logger.warning(f"No data fetched for symbol {symbol}")
                 data = pd.DataFrame()
 
             return data
 
         except Exception as e:
-            print(f"Error fetching data for symbol {symbol}: {e}")
+            count(logger, 'fetch_errors', f"Error fetching data for symbol {symbol}: {e}", level=logging.ERROR, symbol=symbol)
             return pd.DataFrame()
         finally:
             self.disconnect()
@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+class PartitionedBarStore:
+    """
+    Bar history partitioned by month, so a short backtest on a long history only reads the
+    months it overlaps:
+
+        {root}/{symbol}/{dataset}/index.json                 partition -> first/last timestamp, rows
+        {root}/{symbol}/{dataset}/{YYYY-MM}/timestamp.npy, {column}.npy, ...
+
+    `dataset` is the bar size without spaces ('1min', '1day'), like the JSON cache filenames.
+    Columns are stored as float64 so reads return exactly the values that were written.
+    """
+    def __init__(self, root='Data/bar_data/', max_workers=8):
+        self.root = root
+        self.max_workers = max_workers
+
+    def _dataset_dir(self, symbol, dataset):
+        return os.path.join(self.root, symbol, dataset)
+
+    def _index_path(self, symbol, dataset):
+        return os.path.join(self._dataset_dir(symbol, dataset), 'index.json')
+
+    def load_index(self, symbol, dataset):
+        """
+        {'columns': [...], 'partitions': {'YYYY-MM': {'start', 'end', 'rows'}}}, or None if
+        nothing is stored for this symbol and bar size.
+        """
+        path = self._index_path(symbol, dataset)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def coverage(self, symbol, dataset):
+        """
+        (first, last) stored timestamp, read from the index only, or None if nothing is stored.
+        """
+        index = self.load_index(symbol, dataset)
+        if not index or not index['partitions']:
+            return None
+        partitions = index['partitions'].values()
+        return (
+            pd.Timestamp(min(partition['start'] for partition in partitions)),
+            pd.Timestamp(max(partition['end'] for partition in partitions)),
+        )
+
+    def overlapping(self, symbol, dataset, start_date, end_date):
+        """
+        Sorted names of the partitions whose [start, end] overlaps the requested range.
+        """
+        index = self.load_index(symbol, dataset)
+        if not index:
+            return []
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        return sorted(
+            name for name, partition in index['partitions'].items()
+            if pd.Timestamp(partition['start']) <= end and pd.Timestamp(partition['end']) >= start
+        )
+
+    def _read_partition(self, symbol, dataset, name, columns, start_ns, end_ns):
+        directory = os.path.join(self._dataset_dir(symbol, dataset), name)
+        timestamps = np.load(os.path.join(directory, 'timestamp.npy'), mmap_mode='r')
+        lo = np.searchsorted(timestamps, start_ns, side='left')
+        hi = np.searchsorted(timestamps, end_ns, side='right')
+        arrays = {'timestamp': np.array(timestamps[lo:hi])}
+        for column in columns:
+            arrays[column] = np.array(np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r')[lo:hi])
+        return arrays
+
+    def read(self, symbol, dataset, start_date, end_date, columns=None):
+        """
+        Bars in [start_date, end_date] as a DataFrame indexed by timestamp. Only the overlapping
+        partitions are opened, and they are loaded on a thread pool.
+        """
+        index = self.load_index(symbol, dataset)
+        columns = list(index['columns'] if columns is None else columns) if index else list(columns or [])
+        names = self.overlapping(symbol, dataset, start_date, end_date)
+        if not names:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([]), dtype=np.float64)
+
+        start_ns, end_ns = pd.Timestamp(start_date).value, pd.Timestamp(end_date).value
+        jobs = [(symbol, dataset, name, columns, start_ns, end_ns) for name in names]
+        if len(jobs) > 1 and self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+                chunks = list(executor.map(lambda job: self._read_partition(*job), jobs))
+        else:
+            chunks = [self._read_partition(*job) for job in jobs]
+
+        timestamps = pd.DatetimeIndex(np.concatenate([chunk['timestamp'] for chunk in chunks]).astype('datetime64[ns]'))
+        return pd.DataFrame({column: np.concatenate([chunk[column] for chunk in chunks]) for column in columns}, index=timestamps)
+
+    def write(self, data, symbol, dataset):
+        """
+        Merge bars into the store. Only the months present in `data` are rewritten: each is
+        combined with its stored bars (new bars win on duplicate timestamps), swapped in with
+        one rename, and its range updated in the index.
+        """
+        if data.empty:
+            return
+        data = data.sort_index()
+        data = data[~data.index.duplicated(keep='last')]
+        directory = self._dataset_dir(symbol, dataset)
+        os.makedirs(directory, exist_ok=True)
+        index = self.load_index(symbol, dataset) or {'columns': [str(c) for c in data.columns], 'partitions': {}}
+
+        months = data.index.to_period('M')
+        for month in months.unique():
+            name = str(month)
+            frame = data[months == month]
+            if name in index['partitions']:
+                stored = self.read(symbol, dataset, index['partitions'][name]['start'], index['partitions'][name]['end'])
+                frame = pd.concat([stored, frame])
+                frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+
+            partition = os.path.join(directory, name)
+            staging = partition + '.tmp'
+            if os.path.exists(staging):
+                shutil.rmtree(staging)
+            os.makedirs(staging)
+            np.save(os.path.join(staging, 'timestamp.npy'), frame.index.as_unit('ns').asi8)
+            for column in index['columns']:
+                np.save(os.path.join(staging, f'{column}.npy'), frame[column].to_numpy(dtype=np.float64))
+            if os.path.exists(partition):
+                shutil.rmtree(partition)
+            os.rename(staging, partition)
+
+            index['partitions'][name] = {
+                'start': frame.index[0].isoformat(),
+                'end': frame.index[-1].isoformat(),
+                'rows': len(frame),
+            }
+
+        # The index is replaced last, so it never lists a partition that is not on disk
+        staging_index = self._index_path(symbol, dataset) + '.tmp'
+        with open(staging_index, 'w') as f:
+            json.dump(index, f, indent=4, sort_keys=True)
+        os.replace(staging_index, self._index_path(symbol, dataset))
@@ -1,32 +1,28 @@
+import logging
 import os
 from datetime import time
 
 import pandas as pd
 
+from Utils.log_utils import timed
+
+logger = logging.getLogger(__name__)
+
 
 def load_data_from_json(filepath):
     """
     Loads data from a JSON file into a DataFrame.
     """
     if os.path.exists(filepath):
-        data = pd.read_json(filepath, orient='index')
-        data.index = pd.to_datetime(data.index)
-        print(f"Data loaded from {filepath}")
+        with timed(logger, 'cache_load', f"Data loaded from {filepath}", path=filepath) as fields:
+            data = pd.read_json(filepath, orient='index')
+            data.index = pd.to_datetime(data.index)
+            fields['rows'] = len(data)
         return data
     else:
         return None
 
 
-def save_data_to_json(data, filepath):
-    """
-    Saves the DataFrame to a JSON file.
-    """
-    data_to_save = data.copy()
-    data_to_save.index = data_to_save.index.astype(str)
-    data_to_save.to_json(filepath, orient='index')
-    print(f"Data saved to {filepath}")
-
-
 def adjust_to_trading_hours(start_date, end_date):
     """
     Adjust the start and end date to match market trading hours: 9:30 to 15:59.
@@ -1,40 +1,96 @@
-from ib_insync import *
+import logging
+
 import pandas as pd
 
+from Utils.log_utils import count
+
+logger = logging.getLogger(__name__)
+
 
 class PortfolioManager:
-    def __init__(self, ib, hedge_ratio):
+    def __init__(self, ib, hedge_ratio, lot_size=100, risk_engine=None, symbols=('GLD', 'GDX')):
         self.ib = ib
         self.hedge_ratio = hedge_ratio
-        self.positions = {'GLD': 0, 'GDX': 0}
+        self.lot_size = lot_size
+        self.risk_engine = risk_engine
+        # (target, hedge) legs of the pair; several managers can share one IB connection
+        self.symbols = tuple(symbols)
+        self.positions = {symbol: 0 for symbol in self.symbols}
+
+        try:
+            from ib_insync import Stock, MarketOrder
+        except ImportError:
+            # Allows paper trading against the replay simulator without ib_insync installed
+            from Simulation.replay_exchange import Stock, MarketOrder
+        self._stock = Stock
+        self._market_order = MarketOrder
+
+    def execute_trade(self, symbol, action, quantity, check=True):
+        """
+        Send one order. With check=False the pre-trade check is skipped, for legs that were
+        already checked together as one multi-leg order.
+        """
+        signed_quantity = quantity if action == 'BUY' else -quantity
+        if self.risk_engine is not None and check:
+            allowed, reason = self.risk_engine.pre_trade_check(symbol, signed_quantity)
+            if not allowed:
+                count(logger, 'orders_rejected', f"Order rejected by risk engine ({reason}): {action} {quantity} {symbol}",
+                      level=logging.WARNING, reason=reason, symbol=symbol)
+                return None
 
-    def execute_trade(self, symbol, action, quantity):
-        contract = Stock(symbol, 'SMART', 'USD')
+        contract = self._stock(symbol, 'SMART', 'USD')
         self.ib.qualifyContracts(contract)
-        order = MarketOrder(action, quantity)
+        order = self._market_order(action, quantity)
         trade = self.ib.placeOrder(contract, order)
+        self.positions[symbol] += signed_quantity
+
+        if self.risk_engine is not None:
+            # The replay exchange fills synchronously, IB reports fills later through fillEvent
+            for fill in trade.fills:
+                self._on_fill(trade, fill)
+            if hasattr(trade, 'fillEvent'):
+                trade.fillEvent += self._on_fill
         return trade
 
+    def _on_fill(self, trade, fill):
+        side = 1 if trade.order.action == 'BUY' else -1
+        commission = fill.commissionReport.commission if hasattr(fill, 'commissionReport') else fill.commission
+        self.risk_engine.on_fill(trade.contract.symbol, side * fill.execution.shares, fill.execution.price, commission)
+
     def rebalance(self, signal):
-        if signal == 1:
-            # Buy GLD, Sell GDX
-            self.execute_trade('GLD', 'BUY', 100)
-            self.execute_trade('GDX', 'SELL', int(100 * self.hedge_ratio))
-        elif signal == -1:
-            # Sell GLD, Buy GDX
-            self.execute_trade('GLD', 'SELL', 100)
-            self.execute_trade('GDX', 'BUY', int(100 * self.hedge_ratio))
-        # No action for 0 signal
+        """
+        Trade towards the target holdings for the signal:
+        1 -> long GLD / short GDX, -1 -> short GLD / long GDX, 0 -> flat.
+        Only the difference to the current positions is ordered, so calling this on every bar is safe.
+        """
+        target, hedge = self.symbols
+        targets = {
+            target: signal * self.lot_size,
+            hedge: -signal * int(self.lot_size * self.hedge_ratio),
+        }
+        orders = {symbol: target - self.positions[symbol] for symbol, target in targets.items()}
+        orders = {symbol: difference for symbol, difference in orders.items() if difference != 0}
+
+        # All legs are checked as one order before any is sent, and not again leg by leg,
+        # so a rejection never leaves the pair half hedged
+        if self.risk_engine is not None and orders:
+            allowed, reason = self.risk_engine.pre_trade_check_legs(orders)
+            if not allowed:
+                count(logger, 'rebalances_rejected', f"Rebalance to {signal} rejected by risk engine ({reason})",
+                      level=logging.WARNING, reason=reason, signal=signal)
+                return []
+
+        trades = []
+        for symbol, difference in orders.items():
+            action = 'BUY' if difference > 0 else 'SELL'
+            trades.append(self.execute_trade(symbol, action, abs(difference), check=False))
+        return trades
 
     def close_positions(self):
         """
         Sell all the stocks by the end of the day
         """
-        # Close GLD position
-        if self.positions['GLD'] != 0:
-            action = 'SELL' if self.positions['GLD'] > 0 else 'BUY'
-            self.execute_trade('GLD', action, abs(self.positions['GLD']))
-        # Close GDX position
-        if self.positions['GDX'] != 0:
-            action = 'SELL' if self.positions['GDX'] > 0 else 'BUY'
-            self.execute_trade('GDX', action, abs(self.positions['GDX']))
+        for symbol in self.symbols:
+            if self.positions[symbol] != 0:
+                action = 'SELL' if self.positions[symbol] > 0 else 'BUY'
+                self.execute_trade(symbol, action, abs(self.positions[symbol]))
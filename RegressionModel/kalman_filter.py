@@ -0,0 +1,151 @@
+import numpy as np
+
+
+class KalmanHedgeRatio:
+    """
+    Streaming Kalman filter for a time-varying hedge ratio and intercept:
+
+        GLD_t = hedge_ratio_t * GDX_t + alpha_t + e_t,      e_t ~ N(0, observation_variance)
+        [hedge_ratio_t, alpha_t] = [hedge_ratio_t-1, alpha_t-1] + w_t,  w_t ~ N(0, delta / (1 - delta) * I)
+
+    The 2x2 state covariance is kept as three floats, so each update is O(1).
+    """
+    def __init__(self, delta=1e-4, observation_variance=1e-3, initial_state=(0.0, 0.0), initial_covariance=1.0):
+        self.delta = delta
+        self.observation_variance = observation_variance
+        self.state_noise = delta / (1 - delta)
+        self.hedge_ratio, self.alpha = initial_state
+        self.p00 = initial_covariance
+        self.p01 = 0.0
+        self.p11 = initial_covariance
+        self.forecast_error = 0.0
+        self.forecast_variance = observation_variance
+
+    def update(self, price_gld, price_gdx):
+        """
+        Feed one bar and return the (hedge_ratio, alpha) estimated *before* seeing it,
+        i.e. the values a strategy could have traded on at that bar.
+        """
+        hedge_ratio, alpha = self.hedge_ratio, self.alpha
+
+        # Predict: random-walk state, covariance grows by the state noise
+        r00 = self.p00 + self.state_noise
+        r01 = self.p01
+        r11 = self.p11 + self.state_noise
+
+        # Update with the observation vector (price_gdx, 1)
+        rx0 = r00 * price_gdx + r01
+        rx1 = r01 * price_gdx + r11
+        q = price_gdx * rx0 + rx1 + self.observation_variance
+        e = price_gld - (hedge_ratio * price_gdx + alpha)
+        k0 = rx0 / q
+        k1 = rx1 / q
+
+        self.hedge_ratio = hedge_ratio + k0 * e
+        self.alpha = alpha + k1 * e
+        self.p00 = r00 - k0 * rx0
+        self.p01 = r01 - k0 * rx1
+        self.p11 = r11 - k1 * rx1
+        self.forecast_error = e
+        self.forecast_variance = q
+        return hedge_ratio, alpha
+
+
+def kalman_filter(price_gld, price_gdx, delta=1e-4, observation_variance=1e-3, initial_state=(0.0, 0.0),
+                  initial_covariance=1.0, chunk_size=128):
+    """
+    Run the Kalman hedge-ratio recursion over a full price history.
+
+    Parameters:
+    -----------
+    price_gld, price_gdx : array-like
+        Aligned price series of length T.
+    delta, observation_variance : float or array-like
+        Noise parameters. Passing arrays (broadcast to a common length K) filters all K
+        configurations, with the time recursion vectorized across chunk_size of them at a time.
+
+    Returns:
+    --------
+    tuple of np.ndarray
+        (hedge_ratio, alpha), each of shape (T,) for scalar parameters or (K, T) otherwise,
+        one row per configuration like the positions of run_accounting_many.
+        Element t holds the estimate available before bar t.
+    """
+    scalar = np.ndim(delta) == 0 and np.ndim(observation_variance) == 0
+
+    if scalar:
+        y = np.asarray(price_gld, dtype=float)
+        x = np.asarray(price_gdx, dtype=float)
+        # A plain-float loop is faster than NumPy ops on length-1 arrays
+        kf = KalmanHedgeRatio(delta, observation_variance, initial_state, initial_covariance)
+        hedge_ratio = np.empty(len(y))
+        alpha = np.empty(len(y))
+        update = kf.update
+        for t, (y_t, x_t) in enumerate(zip(y.tolist(), x.tolist())):
+            hedge_ratio[t], alpha[t] = update(y_t, x_t)
+        return hedge_ratio, alpha
+
+    chunks = list(kalman_filter_chunks(
+        price_gld, price_gdx, delta, observation_variance, initial_state, initial_covariance, chunk_size
+    ))
+    return np.concatenate([chunk[1] for chunk in chunks]), np.concatenate([chunk[2] for chunk in chunks])
+
+
+def kalman_filter_chunks(price_gld, price_gdx, delta, observation_variance, initial_state=(0.0, 0.0),
+                         initial_covariance=1.0, chunk_size=128):
+    """
+    Filter K configurations chunk_size at a time, so a large grid can be scored without
+    holding every (K, T) estimate in memory, e.g.
+
+        for start, hedge_ratio, alpha in kalman_filter_chunks(gld, gdx, deltas, variances):
+            total_asset = run_accounting_many(gld, gdx, positions[start:start + len(hedge_ratio)], hedge_ratio, ...)
+
+    Yields:
+    -------
+    tuple of (int, np.ndarray, np.ndarray)
+        Index of the first configuration in the chunk, and its hedge_ratio and alpha of
+        shape (chunk, T).
+    """
+    y = np.asarray(price_gld, dtype=float)
+    x = np.asarray(price_gdx, dtype=float)
+    delta, observation_variance = np.broadcast_arrays(
+        np.asarray(delta, dtype=float), np.asarray(observation_variance, dtype=float)
+    )
+    delta = delta.ravel()
+    observation_variance = observation_variance.ravel()
+
+    for start in range(0, len(delta), chunk_size):
+        w = delta[start:start + chunk_size] / (1 - delta[start:start + chunk_size])
+        ve = observation_variance[start:start + chunk_size]
+        k = len(w)
+
+        b0 = np.full(k, float(initial_state[0]))
+        b1 = np.full(k, float(initial_state[1]))
+        p00 = np.full(k, float(initial_covariance))
+        p01 = np.zeros(k)
+        p11 = np.full(k, float(initial_covariance))
+        # Filled a bar at a time, so rows are contiguous; transposed once at the end of the chunk
+        hedge_ratio = np.empty((len(y), k))
+        alpha = np.empty((len(y), k))
+
+        for t in range(len(y)):
+            x_t = x[t]
+            hedge_ratio[t] = b0
+            alpha[t] = b1
+
+            r00 = p00 + w
+            r11 = p11 + w
+            rx0 = r00 * x_t + p01
+            rx1 = p01 * x_t + r11
+            q = x_t * rx0 + rx1 + ve
+            e = y[t] - (b0 * x_t + b1)
+            k0 = rx0 / q
+            k1 = rx1 / q
+
+            b0 = b0 + k0 * e
+            b1 = b1 + k1 * e
+            p00 = r00 - k0 * rx0
+            p01 = p01 - k0 * rx1
+            p11 = r11 - k1 * rx1
+
+        yield start, np.ascontiguousarray(hedge_ratio.T), np.ascontiguousarray(alpha.T)
@@ -1,6 +1,8 @@
-import statsmodels.api as sm
+import numpy as np
 import pandas as pd
 
+from RegressionModel.kalman_filter import kalman_filter
+
 
 class RegressionModel:
     """
@@ -12,16 +14,59 @@ class RegressionModel:
         self.alpha = None
 
     def linear_fit(self):
-        y = self.training_data['GLD']
-        X = self.training_data['GDX']
-        X = sm.add_constant(X)
-        # Linear regression
-        model = sm.OLS(y, X).fit()
-        self.alpha = model.params['const']
-        self.hedge_ratio = model.params['GDX']
+        y = self.training_data['GLD'].to_numpy(dtype=float)
+        x = self.training_data['GDX'].to_numpy(dtype=float)
+        X = np.column_stack([np.ones_like(x), x])
+        # Linear regression (same estimates as sm.OLS(y, sm.add_constant(x)), without importing statsmodels)
+        params, _, _, _ = np.linalg.lstsq(X, y, rcond=None)
+        self.alpha = params[0]
+        self.hedge_ratio = params[1]
+        return self.hedge_ratio, self.alpha
+
+    def kalman_fit(self, data=None, delta=1e-4, observation_variance=1e-3):
+        """
+        Time-varying hedge ratio and intercept from a Kalman filter.
+
+        The filter is causal, so it can be run over training and testing data together:
+        the training bars act as burn-in and every value only uses earlier bars.
+        Returns two Series indexed like `data` (the training data by default).
+        """
+        data = self.training_data if data is None else data
+        hedge_ratio, alpha = kalman_filter(data['GLD'], data['GDX'], delta=delta, observation_variance=observation_variance)
+        self.hedge_ratio = pd.Series(hedge_ratio, index=data.index, name='hedge_ratio')
+        self.alpha = pd.Series(alpha, index=data.index, name='alpha')
+        return self.hedge_ratio, self.alpha
+
+    def basket_fit(self, symbols, method='OLS'):
+        """
+        Hedge weights for a basket spread: the first symbol is the target, the rest hedge it.
+
+        method='OLS' regresses the target on all hedge legs (with intercept), method='Johansen'
+        takes the first cointegrating eigenvector. Weights are normalised so the target has
+        weight 1, giving spread = prices @ weights + alpha like the pair spread.
+
+        Returns:
+        --------
+        tuple of (pd.Series, float)
+            Weights indexed by symbol, and alpha.
+        """
+        prices = self.training_data[list(symbols)].to_numpy(dtype=float)
+        if method == 'Johansen':
+            from statsmodels.tsa.vector_ar.vecm import coint_johansen
+
+            vector = coint_johansen(prices, det_order=0, k_ar_diff=1).evec[:, 0]
+            weights = vector / vector[0]
+            alpha = 0.0
+        else:
+            X = np.column_stack([np.ones(len(prices)), prices[:, 1:]])
+            params, _, _, _ = np.linalg.lstsq(X, prices[:, 0], rcond=None)
+            weights = np.concatenate([[1.0], -params[1:]])
+            alpha = params[0]
+
+        self.hedge_ratio = pd.Series(weights, index=list(symbols), name='weights')
+        self.alpha = alpha
         return self.hedge_ratio, self.alpha
 
     # TODO:(parameter optimization) 可以尝试更多不一样的regression模型找最佳
     def other_fit(self):
         pass
-
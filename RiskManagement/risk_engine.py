@@ -0,0 +1,248 @@
+import time
+from datetime import datetime, time as dt_time
+
+
+class RiskLimits:
+    """
+    Static limits checked by the RiskEngine. Any limit left as None is not enforced.
+    """
+    def __init__(
+            self,
+            max_position_value=None,
+            max_gross_exposure=None,
+            max_net_exposure=None,
+            max_order_quantity=None,
+            max_margin_usage=None,
+            margin_rate=0.5,
+            max_daily_loss=None,
+            max_drawdown=None,
+            flatten_time='15:55'
+        ):
+        self.max_position_value = max_position_value
+        self.max_gross_exposure = max_gross_exposure
+        self.max_net_exposure = max_net_exposure
+        self.max_order_quantity = max_order_quantity
+        self.max_margin_usage = max_margin_usage
+        self.margin_rate = margin_rate
+        self.max_daily_loss = max_daily_loss
+        self.max_drawdown = max_drawdown
+        if isinstance(flatten_time, str):
+            hour, minute = flatten_time.split(':')
+            flatten_time = dt_time(int(hour), int(minute))
+        self.flatten_time = flatten_time
+
+    @classmethod
+    def from_config(cls, risk_config):
+        """
+        Build limits from the `risk` section of config.yaml.
+        """
+        keys = (
+            'max_position_value', 'max_gross_exposure', 'max_net_exposure', 'max_order_quantity',
+            'max_margin_usage', 'margin_rate', 'max_daily_loss', 'max_drawdown', 'flatten_time'
+        )
+        return cls(**{key: risk_config[key] for key in keys if key in risk_config})
+
+
+class RiskEngine:
+    """
+    Incremental risk state for a set of symbols: positions, per-symbol / gross / net exposure,
+    margin usage and running P&L. Every update is O(1) in the number of symbols, so the
+    pre-trade check can run on every order in the backtester as well as in live/paper execution.
+    """
+    def __init__(self, symbols, initial_capital, limits=None):
+        self.limits = limits or RiskLimits()
+        self.initial_capital = initial_capital
+
+        self.positions = {symbol: 0.0 for symbol in symbols}
+        self.marks = {symbol: 0.0 for symbol in symbols}
+        self.exposure = {symbol: 0.0 for symbol in symbols}
+        self.gross_exposure = 0.0
+        self.net_exposure = 0.0
+        self.cash = float(initial_capital)
+
+        self.equity = float(initial_capital)
+        self.peak_equity = float(initial_capital)
+        self.day_start_equity = float(initial_capital)
+        self.current_day = None
+
+        self.killed = False
+        self.kill_reason = None
+        self.rejections = 0
+
+    # ----- State updates -----
+
+    def add_symbols(self, symbols):
+        """
+        Start tracking more symbols, flat and unmarked, e.g. when a pair is added to a running service.
+        """
+        for symbol in symbols:
+            if symbol not in self.positions:
+                self.positions[symbol] = 0.0
+                self.marks[symbol] = 0.0
+                self.exposure[symbol] = 0.0
+
+    def _set_exposure(self, symbol):
+        old = self.exposure[symbol]
+        new = self.positions[symbol] * self.marks[symbol]
+        self.exposure[symbol] = new
+        self.gross_exposure += abs(new) - abs(old)
+        self.net_exposure += new - old
+        self.equity = self.cash + self.net_exposure
+
+    def on_price(self, symbol, price, timestamp=None):
+        """
+        Mark a symbol to market and re-evaluate the kill switch.
+        """
+        if timestamp is not None:
+            self._roll_day(timestamp)
+        self.marks[symbol] = price
+        self._set_exposure(symbol)
+        if self.equity > self.peak_equity:
+            self.peak_equity = self.equity
+        self._check_kill_switch()
+
+    def on_fill(self, symbol, quantity, price, commission=0.0):
+        """
+        Apply a fill. `quantity` is signed: positive for buys, negative for sells.
+        """
+        self.cash -= quantity * price + commission
+        self.positions[symbol] += quantity
+        self.marks[symbol] = price
+        self._set_exposure(symbol)
+        self._check_kill_switch()
+
+    def _roll_day(self, timestamp):
+        day = timestamp.date()
+        if day != self.current_day:
+            self.current_day = day
+            self.day_start_equity = self.equity
+
+    # ----- Checks -----
+
+    def pre_trade_check(self, symbol, quantity, price=None):
+        """
+        Check a signed order against the limits before it is sent.
+
+        Returns:
+        --------
+        tuple of (bool, str or None)
+            Whether the order is allowed, and the name of the violated limit if not.
+            Orders that only reduce an existing position are always allowed, so
+            flattening keeps working after the kill switch has fired.
+        """
+        return self.pre_trade_check_legs({symbol: quantity}, None if price is None else {symbol: price})
+
+    def pre_trade_check_legs(self, orders, prices=None):
+        """
+        Check the legs of one multi-leg order together, e.g. both sides of a pair rebalance.
+        `orders` maps symbol to signed quantity. Gross, net and margin limits are checked on the
+        combined result of all legs, so the order is accepted or rejected as a whole.
+
+        Returns:
+        --------
+        tuple of (bool, str or None)
+            As pre_trade_check. An order whose legs all reduce positions is always allowed.
+        """
+        limits = self.limits
+        legs = []
+        reduces = True
+        for symbol, quantity in orders.items():
+            position = self.positions[symbol]
+            new_position = position + quantity
+            leg_reduces = abs(new_position) <= abs(position) and position * new_position >= 0
+            reduces = reduces and leg_reduces
+            price = self.marks[symbol] if prices is None or symbol not in prices else prices[symbol]
+            legs.append((symbol, quantity, new_position * price, leg_reduces))
+        if reduces:
+            return True, None
+        if self.killed:
+            return self._reject('kill_switch')
+
+        gross = self.gross_exposure
+        net = self.net_exposure
+        for symbol, quantity, new_exposure, leg_reduces in legs:
+            old_exposure = self.exposure[symbol]
+            gross += abs(new_exposure) - abs(old_exposure)
+            net += new_exposure - old_exposure
+            if leg_reduces:
+                continue
+            if limits.max_order_quantity is not None and abs(quantity) > limits.max_order_quantity:
+                return self._reject('max_order_quantity')
+            if limits.max_position_value is not None and abs(new_exposure) > limits.max_position_value:
+                return self._reject('max_position_value')
+
+        if limits.max_gross_exposure is not None and gross > limits.max_gross_exposure:
+            return self._reject('max_gross_exposure')
+        if limits.max_net_exposure is not None and abs(net) > limits.max_net_exposure:
+            return self._reject('max_net_exposure')
+        if limits.max_margin_usage is not None and self.equity > 0:
+            if gross * limits.margin_rate / self.equity > limits.max_margin_usage:
+                return self._reject('max_margin_usage')
+        return True, None
+
+    def _reject(self, reason):
+        self.rejections += 1
+        return False, reason
+
+    def _check_kill_switch(self):
+        if self.killed:
+            return
+        limits = self.limits
+        if limits.max_daily_loss is not None and self.day_start_equity - self.equity > limits.max_daily_loss:
+            self.kill('max_daily_loss')
+        elif limits.max_drawdown is not None and self.peak_equity - self.equity > limits.max_drawdown:
+            self.kill('max_drawdown')
+
+    def kill(self, reason='manual'):
+        """
+        Trip the kill switch: no new risk is accepted until reset() is called.
+        """
+        self.killed = True
+        self.kill_reason = reason
+
+    def reset(self):
+        self.killed = False
+        self.kill_reason = None
+
+    def should_flatten(self, timestamp):
+        """
+        True once the bar time reaches the end-of-day flatten time, or after the kill switch fired.
+        """
+        if self.killed:
+            return True
+        flatten_time = self.limits.flatten_time
+        return flatten_time is not None and timestamp.time() >= flatten_time
+
+    def margin_usage(self):
+        if self.equity <= 0:
+            return float('inf')
+        return self.gross_exposure * self.limits.margin_rate / self.equity
+
+    def snapshot(self):
+        return {
+            'Positions': dict(self.positions),
+            'Gross Exposure ($)': self.gross_exposure,
+            'Net Exposure ($)': self.net_exposure,
+            'Margin Usage (%)': self.margin_usage() * 100,
+            'Equity ($)': self.equity,
+            'Daily P&L ($)': self.equity - self.day_start_equity,
+            'Total P&L ($)': self.equity - self.initial_capital,
+            'Kill Switch': self.kill_reason if self.killed else None,
+            'Rejected Orders': self.rejections,
+        }
+
+
+if __name__ == "__main__":
+    # Rough per-order latency of the pre-trade check
+    engine = RiskEngine(['GLD', 'GDX'], 100000, RiskLimits(
+        max_position_value=60000, max_gross_exposure=120000, max_net_exposure=20000,
+        max_order_quantity=1000, max_margin_usage=1.0, max_daily_loss=2000
+    ))
+    engine.on_price('GLD', 230.0, datetime(2024, 10, 1, 10, 0))
+    engine.on_price('GDX', 38.0, datetime(2024, 10, 1, 10, 0))
+    n = 200000
+    start = time.perf_counter()
+    for i in range(n):
+        engine.pre_trade_check('GLD', 100 if i & 1 else -100, 230.0)
+    elapsed = time.perf_counter() - start
+    print(f"pre_trade_check: {elapsed / n * 1e6:.3f} us per order")
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import os
+
+import yaml
+
+from Strategy.strategy import StreamingPairTradingStrategy
+from PortfolioManagement.portfolio_manager import PortfolioManager
+from Utils.main_utils import load_config
+from Utils.log_utils import count
+
+logger = logging.getLogger(__name__)
+
+
+def pair_configs(config):
+    """
+    {name: settings} for every pair the service should run.
+
+    Pairs are listed under `service.pairs` as {'symbols': [target, hedge]} with optional `name`,
+    `window`, `z_threshold` and `lot_size` overrides of the `strategy` / `service` defaults.
+    Without a list, the pair in data.commodities is run on its own.
+    """
+    service_config = config.get('service') or {}
+    defaults = {
+        'window': config['strategy']['window'],
+        'z_threshold': config['strategy']['z_threshold'],
+        'lot_size': service_config.get('lot_size', 100),
+    }
+    entries = service_config.get('pairs') or [{'symbols': config['data']['commodities'][:2]}]
+
+    pairs = {}
+    for entry in entries:
+        symbols = tuple(entry['symbols'])
+        if len(symbols) != 2:
+            raise ValueError(f"A pair needs exactly two symbols, got {list(symbols)}")
+        name = entry.get('name', '_'.join(symbols))
+        settings = dict(defaults)
+        settings.update({key: value for key, value in entry.items() if key in defaults})
+        settings['symbols'] = symbols
+        pairs[name] = settings
+    return pairs
+
+
+class ReplaySource:
+    """
+    Market data from a Simulation.replay_exchange.ReplayIB. Only symbols in the replayed data
+    can be subscribed; the replay runs once and then the service stops.
+    """
+    def __init__(self, ib):
+        self.ib = ib
+        self.symbols = set()
+
+    async def subscribe(self, symbol):
+        from Simulation.replay_exchange import Stock
+
+        self.ib.qualifyContracts(Stock(symbol))
+        self.symbols.add(symbol)
+
+    async def unsubscribe(self, symbol):
+        self.symbols.discard(symbol)
+
+    async def bars(self):
+        async for timestamp, prices in self.ib.replay_async():
+            yield timestamp, {symbol: price for symbol, price in prices.items() if symbol in self.symbols}
+
+
+class IBSource:
+    """
+    Live bars from one ib_insync IB connection, via keepUpToDate historical data requests.
+    A bar is published once all subscribed symbols have completed it.
+    """
+    def __init__(self, ib, bar_size='1 min', what_to_show='TRADES', use_rth=True):
+        self.ib = ib
+        self.bar_size = bar_size
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self.subscriptions = {}
+        self.pending = {}
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, symbol):
+        from ib_insync import Stock
+
+        contract = Stock(symbol, 'SMART', 'USD')
+        await self.ib.qualifyContractsAsync(contract)
+        bars = await self.ib.reqHistoricalDataAsync(
+            contract, endDateTime='', durationStr='1800 S', barSizeSetting=self.bar_size,
+            whatToShow=self.what_to_show, useRTH=self.use_rth, keepUpToDate=True
+        )
+        bars.updateEvent += lambda bars, has_new_bar: self._on_update(symbol, bars, has_new_bar)
+        self.subscriptions[symbol] = bars
+
+    async def unsubscribe(self, symbol):
+        bars = self.subscriptions.pop(symbol, None)
+        if bars is not None:
+            self.ib.cancelHistoricalData(bars)
+
+    def _on_update(self, symbol, bars, has_new_bar):
+        # A new bar has started, so the one before it is complete
+        if not has_new_bar or len(bars) < 2:
+            return
+        bar = bars[-2]
+        prices = self.pending.setdefault(bar.date, {})
+        prices[symbol] = bar.close
+        if set(self.subscriptions) <= set(prices):
+            for timestamp in [timestamp for timestamp in self.pending if timestamp <= bar.date]:
+                del self.pending[timestamp]
+            self.queue.put_nowait((bar.date, prices))
+
+    async def bars(self):
+        while True:
+            yield await self.queue.get()
+
+
+class MarketDataHub:
+    """
+    Reference-counted subscriptions: a symbol is requested from the source once, however many
+    pairs trade it, and released when the last of them stops.
+    """
+    def __init__(self, source):
+        self.source = source
+        self.subscribers = {}
+
+    async def subscribe(self, name, symbols):
+        for symbol in symbols:
+            if symbol not in self.subscribers:
+                await self.source.subscribe(symbol)
+                self.subscribers[symbol] = set()
+            self.subscribers[symbol].add(name)
+
+    async def unsubscribe(self, name, symbols):
+        for symbol in symbols:
+            names = self.subscribers.get(symbol)
+            if names is None:
+                continue
+            names.discard(name)
+            if not names:
+                del self.subscribers[symbol]
+                await self.source.unsubscribe(symbol)
+
+
+class PairRunner:
+    """
+    One pair in the service: streaming signals, its own PortfolioManager on the shared IB
+    connection, and optionally a streaming Kalman filter and the RiskEngine shared by all pairs.
+    """
+    def __init__(self, name, settings, ib, hedge_ratio, alpha, kalman=None, risk_engine=None):
+        self.name = name
+        self.symbols = settings['symbols']
+        self.settings = settings
+        self.kalman = kalman
+        self.risk_engine = risk_engine
+        self.strategy = StreamingPairTradingStrategy(
+            hedge_ratio, alpha, z_threshold=settings['z_threshold'], window=settings['window']
+        )
+        self.portfolio_manager = PortfolioManager(
+            ib, hedge_ratio, lot_size=settings['lot_size'], risk_engine=risk_engine, symbols=self.symbols
+        )
+        self.bars = 0
+
+    def apply(self, settings):
+        """
+        Take over changed parameters without resetting the rolling spread window or positions.
+        """
+        if settings['window'] != self.strategy.window:
+            self.strategy.resize(settings['window'])
+        self.strategy.z_threshold = settings['z_threshold']
+        self.portfolio_manager.lot_size = settings['lot_size']
+        self.settings = settings
+
+    def on_bar(self, timestamp, prices):
+        target, hedge = self.symbols
+        if self.kalman is not None:
+            hedge_ratio, alpha = self.kalman.update(prices[target], prices[hedge])
+            self.portfolio_manager.hedge_ratio = hedge_ratio
+            signal = self.strategy.update(prices[target], prices[hedge], hedge_ratio=hedge_ratio, alpha=alpha)
+        else:
+            signal = self.strategy.update(prices[target], prices[hedge])
+        self.bars += 1
+
+        if self.risk_engine is not None:
+            for symbol in self.symbols:
+                self.risk_engine.on_price(symbol, prices[symbol], timestamp)
+            if self.risk_engine.should_flatten(timestamp):
+                self.portfolio_manager.close_positions()
+                return
+        self.portfolio_manager.rebalance(signal)
+
+    def stop(self):
+        self.portfolio_manager.close_positions()
+
+
+class StrategyService:
+    """
+    Long-running asyncio service that trades many pairs on one IB connection.
+
+    Bars from the source are delivered to every pair whose symbols they contain. The config file
+    is polled every `reload_interval` seconds; added pairs are started, removed pairs are closed
+    out, and changed window / z_threshold / lot_size are applied to running pairs in place.
+    Reloads happen between bars, and a config that fails to parse is ignored until it is fixed.
+    Risk limits, credentials and data settings are read once at start.
+
+    Parameters:
+    -----------
+    config_path : str
+        YAML config, see pair_configs for the `service` section.
+    source : ReplaySource or IBSource
+        Market data source; subscriptions are shared through a MarketDataHub.
+    build_pair : coroutine function
+        await build_pair(name, settings) -> PairRunner, fits the hedge ratio of a new pair.
+    reload_interval : float
+        Seconds between config file checks.
+    """
+    def __init__(self, config_path, source, build_pair, reload_interval=1.0):
+        self.config_path = config_path
+        self.hub = MarketDataHub(source)
+        self.source = source
+        self.build_pair = build_pair
+        self.reload_interval = reload_interval
+        self.runners = {}
+        self.config = None
+        self.bars = 0
+        self._config_stamp = None
+        self._task = None
+
+    def _stamp(self):
+        stat = os.stat(self.config_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    async def reload(self, force=False):
+        """
+        Re-read the config file if it changed and bring the running pairs in line with it.
+        Returns True if a new config was applied.
+        """
+        try:
+            stamp = self._stamp()
+            if stamp == self._config_stamp and not force:
+                return False
+            # A broken file is reported once, and retried when it changes again
+            self._config_stamp = stamp
+            config = load_config(self.config_path)
+            pairs = pair_configs(config)
+        except (OSError, yaml.YAMLError, KeyError, TypeError, ValueError) as error:
+            count(logger, 'config_reload_errors', f"Config reload failed, keeping the running config: {error}",
+                  level=logging.ERROR, path=self.config_path)
+            return False
+
+        self.config = config
+        await self._sync_pairs(pairs)
+        count(logger, 'config_reloads', f"Config loaded from {self.config_path}: {len(self.runners)} pairs running.",
+              path=self.config_path, pairs=sorted(self.runners))
+        return True
+
+    async def _sync_pairs(self, pairs):
+        for name in list(self.runners):
+            runner = self.runners[name]
+            if name not in pairs or pairs[name]['symbols'] != runner.symbols:
+                del self.runners[name]
+                runner.stop()
+                await self.hub.unsubscribe(name, runner.symbols)
+                logger.info(f"Stopped pair {name}")
+
+        for name, settings in pairs.items():
+            if name in self.runners:
+                if settings != self.runners[name].settings:
+                    self.runners[name].apply(settings)
+                    logger.info(f"Updated pair {name}: {settings}")
+                continue
+            try:
+                await self.hub.subscribe(name, settings['symbols'])
+                self.runners[name] = await self.build_pair(name, settings)
+            except Exception:
+                logger.exception(f"Could not start pair {name}")
+                await self.hub.unsubscribe(name, settings['symbols'])
+                continue
+            logger.info(f"Started pair {name}: {settings}")
+
+    async def _watch_config(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    async def run(self):
+        """
+        Load the config, start the pairs and trade until the source ends or stop() is called.
+        All positions are closed on the way out.
+        """
+        self._task = asyncio.current_task()
+        await self.reload(force=True)
+        watcher = asyncio.create_task(self._watch_config())
+        try:
+            async for timestamp, prices in self.source.bars():
+                self.bars += 1
+                for runner in list(self.runners.values()):
+                    if all(symbol in prices for symbol in runner.symbols):
+                        runner.on_bar(timestamp, prices)
+        except asyncio.CancelledError:
+            logger.info("Strategy service stopping")
+        finally:
+            watcher.cancel()
+            for runner in self.runners.values():
+                runner.stop()
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
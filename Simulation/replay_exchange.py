@@ -0,0 +1,264 @@
+import time
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+
+
+# Minimal stand-ins for the ib_insync objects the simulator reads. Real ib_insync
+# Stock/MarketOrder instances work as well, only the attribute names matter.
+@dataclass
+class Stock:
+    symbol: str
+    exchange: str = 'SMART'
+    currency: str = 'USD'
+
+
+@dataclass
+class MarketOrder:
+    action: str
+    totalQuantity: float
+    orderId: int = 0
+
+
+@dataclass
+class OrderStatus:
+    status: str = 'PendingSubmit'
+    filled: float = 0.0
+    remaining: float = 0.0
+    avgFillPrice: float = 0.0
+
+
+@dataclass
+class Execution:
+    time: datetime
+    side: str
+    shares: float
+    price: float
+
+
+@dataclass
+class Fill:
+    contract: Stock
+    execution: Execution
+    commission: float
+    time: datetime
+
+
+@dataclass
+class Trade:
+    contract: Stock
+    order: MarketOrder
+    orderStatus: OrderStatus = field(default_factory=OrderStatus)
+    fills: list = field(default_factory=list)
+
+    def isDone(self):
+        return self.orderStatus.status in ('Filled', 'Cancelled')
+
+
+Position = namedtuple('Position', ['account', 'contract', 'position', 'avgCost'])
+
+
+class ReplayIB:
+    """
+    Local exchange simulator that replays cached bars and fills orders against them.
+    Implements the subset of the ib_insync.IB interface used by PortfolioManager
+    (connect, isConnected, qualifyContracts, placeOrder, positions, fills, disconnect),
+    so the live loop can run end to end without TWS or IB Gateway.
+    """
+
+    ACCOUNT = 'REPLAY'
+
+    def __init__(self, data, speed=None, bar_interval=60, commission_per_share=0.0035, slippage_bps=0.0):
+        """
+        Parameters:
+        -----------
+        data : pd.DataFrame
+            Aligned close prices, one column per symbol, indexed by bar timestamp.
+        speed : float or None
+            None or 0 replays as fast as possible, 1.0 in real time, 60.0 sixty times faster, etc.
+        bar_interval : float
+            Seconds per bar, used to pace the replay. Session gaps are not slept through.
+        commission_per_share : float
+            Commission charged per share filled, same convention as Backtester.transaction_cost.
+        slippage_bps : float
+            Adverse slippage applied to every fill, in basis points of the bar price.
+        """
+        self.data = data
+        self.symbols = list(data.columns)
+        self.speed = speed
+        self.bar_interval = bar_interval
+        self.commission_per_share = commission_per_share
+        self.slippage_bps = slippage_bps
+
+        self._prices = data.to_numpy(dtype=float)
+        self._timestamps = data.index
+        self._column = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._cursor = -1
+        self._connected = False
+        self._next_order_id = 1
+
+        self._positions = {symbol: 0.0 for symbol in self.symbols}
+        self._avg_cost = {symbol: 0.0 for symbol in self.symbols}
+        self._trades = []
+        self._fills = []
+        self.cash = 0.0
+
+        # Latency samples (ns) from bar publication to order fill
+        self._bar_published_ns = 0
+        self._latencies_ns = []
+        self._replay_started = None
+        self._replay_elapsed = 0.0
+
+    # ----- ib_insync.IB compatible interface -----
+
+    def connect(self, host='127.0.0.1', port=7497, clientId=1, **kwargs):
+        self._connected = True
+        return self
+
+    def disconnect(self):
+        self._connected = False
+
+    def isConnected(self):
+        return self._connected
+
+    def qualifyContracts(self, *contracts):
+        for contract in contracts:
+            if contract.symbol not in self._column:
+                raise ValueError(f"Unknown symbol in replay data: {contract.symbol}")
+        return list(contracts)
+
+    def placeOrder(self, contract, order):
+        if not self._connected:
+            raise ConnectionError("ReplayIB is not connected")
+        if self._cursor < 0:
+            raise RuntimeError("No bar has been replayed yet, cannot fill orders")
+
+        order.orderId = self._next_order_id
+        self._next_order_id += 1
+        trade = Trade(contract, order, OrderStatus(status='Submitted', remaining=order.totalQuantity))
+        self._trades.append(trade)
+        self._fill(trade)
+        return trade
+
+    def positions(self):
+        return [
+            Position(self.ACCOUNT, Stock(symbol), quantity, self._avg_cost[symbol])
+            for symbol, quantity in self._positions.items() if quantity != 0
+        ]
+
+    def trades(self):
+        return list(self._trades)
+
+    def fills(self):
+        return list(self._fills)
+
+    def sleep(self, seconds=0):
+        time.sleep(seconds)
+
+    # ----- Replay -----
+
+    def current_time(self):
+        return self._timestamps[self._cursor]
+
+    def current_price(self, symbol):
+        return self._prices[self._cursor, self._column[symbol]]
+
+    def net_liquidation(self):
+        holdings = sum(self._positions[symbol] * self.current_price(symbol) for symbol in self.symbols)
+        return self.cash + holdings
+
+    def _pacing(self):
+        """
+        Wall-clock seconds to wait before each bar, or None when replaying as fast as possible.
+        """
+        if not self.speed:
+            return None
+        timestamps = self._timestamps
+        gaps = np.diff(timestamps.asi8) / 1e9 if len(timestamps) > 1 else np.array([])
+        # Overnight and weekend gaps are replayed as a single bar interval
+        return np.r_[0.0, np.minimum(gaps, self.bar_interval) / self.speed]
+
+    def _publish(self, i):
+        self._cursor = i
+        self._bar_published_ns = time.perf_counter_ns()
+        return self._timestamps[i], dict(zip(self.symbols, self._prices[i]))
+
+    def replay(self):
+        """
+        Advance through the bars, yielding (timestamp, {symbol: price}) for each one.
+        Orders placed while a bar is current are filled at that bar's price.
+        """
+        gaps = self._pacing()
+        self._replay_started = time.perf_counter()
+        next_wall = self._replay_started
+        for i in range(len(self._timestamps)):
+            if gaps is not None:
+                next_wall += gaps[i]
+                delay = next_wall - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield self._publish(i)
+        self._replay_elapsed = time.perf_counter() - self._replay_started
+
+    async def replay_async(self):
+        """
+        Same as replay(), as an async generator that waits with asyncio.sleep, so other tasks
+        on the event loop keep running between bars.
+        """
+        import asyncio
+
+        gaps = self._pacing()
+        self._replay_started = time.perf_counter()
+        next_wall = self._replay_started
+        for i in range(len(self._timestamps)):
+            if gaps is not None:
+                next_wall += gaps[i]
+                await asyncio.sleep(max(next_wall - time.perf_counter(), 0.0))
+            else:
+                await asyncio.sleep(0)
+            yield self._publish(i)
+        self._replay_elapsed = time.perf_counter() - self._replay_started
+
+    def _fill(self, trade):
+        symbol = trade.contract.symbol
+        quantity = trade.order.totalQuantity
+        side = 1 if trade.order.action == 'BUY' else -1
+        price = self.current_price(symbol) * (1 + side * self.slippage_bps / 1e4)
+        commission = abs(quantity) * self.commission_per_share
+
+        previous = self._positions[symbol]
+        updated = previous + side * quantity
+        if updated == 0:
+            self._avg_cost[symbol] = 0.0
+        elif previous == 0 or np.sign(previous) != np.sign(updated):
+            self._avg_cost[symbol] = price
+        elif abs(updated) > abs(previous):
+            self._avg_cost[symbol] = (abs(previous) * self._avg_cost[symbol] + quantity * price) / abs(updated)
+        self._positions[symbol] = updated
+        self.cash -= side * quantity * price + commission
+
+        timestamp = self.current_time()
+        fill = Fill(trade.contract, Execution(timestamp, 'BOT' if side > 0 else 'SLD', quantity, price), commission, timestamp)
+        trade.fills.append(fill)
+        trade.orderStatus = OrderStatus(status='Filled', filled=quantity, remaining=0.0, avgFillPrice=price)
+        self._fills.append(fill)
+        self._latencies_ns.append(time.perf_counter_ns() - self._bar_published_ns)
+
+    def stats(self):
+        """
+        Throughput and latency figures for the replay so far.
+        """
+        bars = self._cursor + 1
+        elapsed = self._replay_elapsed or (time.perf_counter() - self._replay_started if self._replay_started else 0.0)
+        latencies = np.array(self._latencies_ns, dtype=float) / 1e3
+        return {
+            'Bars Replayed': bars,
+            'Orders Filled': len(self._fills),
+            'Elapsed (s)': elapsed,
+            'Bars per Second': bars / elapsed if elapsed > 0 else float('inf'),
+            'Bar-to-Fill Latency p50 (us)': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'Bar-to-Fill Latency p99 (us)': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'Bar-to-Fill Latency max (us)': float(latencies.max()) if len(latencies) else None,
+        }
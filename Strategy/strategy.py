@@ -1,26 +1,86 @@
+from collections import deque
+
 import pandas as pd
 import numpy as np
 
 
+def align_to_index(value, index):
+    """
+    Leave scalars untouched and reindex per-bar parameters (Series) to the given bars.
+    """
+    if isinstance(value, pd.Series):
+        return value.reindex(index)
+    return value
+
+
+def session_boundaries(index):
+    """
+    Split bars into sessions (calendar days) without a per-bar loop.
+
+    Returns:
+    --------
+    tuple of (np.ndarray, np.ndarray)
+        Position of the first bar of every session, and the session number of every bar.
+    """
+    days = index.normalize().asi8
+    new_session = np.r_[True, days[1:] != days[:-1]]
+    return np.flatnonzero(new_session), np.cumsum(new_session) - 1
+
+
+def flat_at_close_mask(index, flatten_time=None):
+    """
+    True on the last bar of every session and, if flatten_time ('HH:MM') is given, on all
+    bars at or after that time of day.
+    """
+    days = index.normalize().asi8
+    mask = np.r_[days[1:] != days[:-1], True]
+    if flatten_time is not None:
+        hour, minute = flatten_time.split(':')
+        mask |= np.asarray(index.hour * 60 + index.minute) >= int(hour) * 60 + int(minute)
+    return mask
+
+
 class PairTradingStrategy:
-    def __init__(self, data, hedge_ratio, alpha, z_threshold=3, window=100):
+    """
+    Z-score strategy on the rolling statistics of the spread.
+
+    With sessions='reset' the rolling window restarts every day, so the first window - 1 bars
+    of a session have no signal; with sessions='carry' it spans the overnight gap as before.
+    In both session modes positions are forced flat on the last bar of each day (and from
+    flatten_time on, if given). sessions=None keeps positions across days.
+    """
+    def __init__(self, data, hedge_ratio, alpha, z_threshold=3, window=100, sessions=None, flatten_time=None):
+        if sessions not in (None, 'reset', 'carry'):
+            raise ValueError(f"Unknown session mode: {sessions}")
         self.data = data.copy()
-        self.hedge_ratio = hedge_ratio
-        self.alpha = alpha
+        # hedge_ratio / alpha are scalars (OLS) or per-bar Series (Kalman filter)
+        self.hedge_ratio = align_to_index(hedge_ratio, self.data.index)
+        self.alpha = align_to_index(alpha, self.data.index)
         self.z_threshold = z_threshold
         self.window = window
+        self.sessions = sessions
+        self.flatten_time = flatten_time
         self.signals = pd.DataFrame(index=self.data.index)
 
+    def compute_spread(self):
+        return self.data['GLD'] - self.hedge_ratio * self.data['GDX'] + self.alpha
+
     def generate_signals(self):
         epsilon = 1e-8  # Small value to avoid division by zero
 
         # Calculate spread
-        self.data.loc[:, 'spread'] = self.data['GLD'] - self.hedge_ratio * self.data['GDX'] + self.alpha
+        self.data.loc[:, 'spread'] = self.compute_spread()
 
         # Calculate rolling mean and std
         self.data.loc[:, 'spread_mean'] = self.data['spread'].rolling(window=self.window).mean()
         self.data.loc[:, 'spread_std'] = self.data['spread'].rolling(window=self.window).std()
 
+        if self.sessions == 'reset':
+            # Equivalent to a rolling window per session: drop the windows that reach into the previous day
+            starts, session = session_boundaries(self.data.index)
+            warmup = np.arange(len(self.data)) - starts[session] < self.window - 1
+            self.data.loc[warmup, ['spread_mean', 'spread_std']] = np.nan
+
         # Replace zero std with epsilon
         self.data.loc[:, 'spread_std'] = self.data['spread_std'].replace(0, epsilon)
 
@@ -34,4 +94,99 @@ class PairTradingStrategy:
         self.signals.loc[self.data['z_score'] > self.z_threshold, 'positions'] = -1
         self.signals.loc[self.data['z_score'] < -self.z_threshold, 'positions'] = 1
 
+        # Be flat overnight
+        if self.sessions is not None:
+            self.signals.loc[flat_at_close_mask(self.data.index, self.flatten_time), 'positions'] = 0
+
         return self.signals
+
+
+class BasketTradingStrategy(PairTradingStrategy):
+    """
+    Spread over any number of legs: spread = prices @ weights + alpha, where `weights` is a
+    Series indexed by symbol (target leg normalised to 1, hedge legs negative), e.g. from
+    RegressionModel.basket_fit. Rolling z-score and signals are the same as for a pair.
+    """
+    def __init__(self, data, weights, alpha, z_threshold=3, window=100, sessions=None, flatten_time=None):
+        super().__init__(data, hedge_ratio=None, alpha=alpha, z_threshold=z_threshold, window=window,
+                         sessions=sessions, flatten_time=flatten_time)
+        self.weights = weights
+
+    def compute_spread(self):
+        prices = self.data[list(self.weights.index)].to_numpy(dtype=float)
+        return pd.Series(prices @ self.weights.to_numpy(dtype=float) + self.alpha, index=self.data.index)
+
+
+class StreamingPairTradingStrategy:
+    """
+    Bar-by-bar version of PairTradingStrategy for live and replayed trading.
+    Keeps running sums over the last `window` spreads, so each update is O(1)
+    and produces the same positions as generate_signals on the same bars.
+    """
+    def __init__(self, hedge_ratio, alpha, z_threshold=3, window=100):
+        self.hedge_ratio = hedge_ratio
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.window = window
+        self.spreads = deque(maxlen=window)
+        self.spread_sum = 0.0
+        self.spread_sq_sum = 0.0
+        # Sums are kept relative to the first spread seen to avoid cancellation in the variance
+        self.shift = None
+        self.z_score = np.nan
+        self.position = 0
+
+    def resize(self, window):
+        """
+        Change the window without losing state: the most recent spreads are kept and the running
+        sums rebuilt from them. A larger window has no signal until it has filled up again.
+        """
+        spreads = list(self.spreads)[-window:]
+        self.window = window
+        self.spreads = deque(spreads, maxlen=window)
+        self.spread_sum = float(sum(spreads))
+        self.spread_sq_sum = float(sum(spread * spread for spread in spreads))
+
+    def update(self, price_gld, price_gdx, hedge_ratio=None, alpha=None):
+        """
+        Feed one bar and return the position. hedge_ratio / alpha override the stored
+        values for this and later bars, e.g. with estimates from a streaming Kalman filter.
+        """
+        epsilon = 1e-8
+
+        if hedge_ratio is not None:
+            self.hedge_ratio = hedge_ratio
+        if alpha is not None:
+            self.alpha = alpha
+
+        spread = price_gld - self.hedge_ratio * price_gdx + self.alpha
+        if self.shift is None:
+            self.shift = spread
+        spread -= self.shift
+        if len(self.spreads) == self.window:
+            oldest = self.spreads[0]
+            self.spread_sum -= oldest
+            self.spread_sq_sum -= oldest * oldest
+        self.spreads.append(spread)
+        self.spread_sum += spread
+        self.spread_sq_sum += spread * spread
+
+        if len(self.spreads) < self.window or self.window < 2:
+            self.z_score = np.nan
+            self.position = 0
+            return self.position
+
+        mean = self.spread_sum / self.window
+        variance = max((self.spread_sq_sum - self.window * mean * mean) / (self.window - 1), 0.0)
+        std = np.sqrt(variance)
+        if std == 0:
+            std = epsilon
+
+        self.z_score = (spread - mean) / std
+        if self.z_score > self.z_threshold:
+            self.position = -1
+        elif self.z_score < -self.z_threshold:
+            self.position = 1
+        else:
+            self.position = 0
+        return self.position
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from Utils.log_utils import count
+
+logger = logging.getLogger(__name__)
+
+# Config sections that do not change the result of a run and are left out of its fingerprint
+NON_RESULT_SECTIONS = ('credentials', 'logging', 'profiling', 'registry')
+
+
+@lru_cache(maxsize=None)
+def code_version(repo_dir='.'):
+    """
+    Git commit of the working tree, with a hash of the uncommitted diff appended when the
+    tree is dirty, e.g. 'a6e30d7c...' or 'a6e30d7c...+3f2a9b1c'. 'unknown' outside of git.
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=repo_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        diff = subprocess.run(
+            ['git', 'diff', 'HEAD', '--', '*.py'], cwd=repo_dir, capture_output=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    if diff:
+        commit += '+' + hashlib.sha256(diff).hexdigest()[:8]
+    return commit
+
+
+def data_hash(data):
+    """
+    SHA-256 of the timestamps, column names and values of a price DataFrame.
+    """
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(data.index.as_unit('ns').asi8).tobytes())
+    digest.update(json.dumps([str(column) for column in data.columns]).encode())
+    digest.update(np.ascontiguousarray(data.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def flatten(mapping, prefix=''):
+    """
+    {'data': {'window': 10}} -> {'data.window': 10}, lists are kept as values.
+    """
+    flat = {}
+    for key, value in mapping.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def fingerprint(config, data):
+    """
+    Identify a backtest by everything that determines its result: the config (without
+    NON_RESULT_SECTIONS), the date range and content hash of the input bars, and the code version.
+
+    Returns:
+    --------
+    tuple of (str, dict)
+        The fingerprint (hex SHA-256) and the description it was computed from.
+    """
+    description = {
+        'config': {key: value for key, value in config.items() if key not in NON_RESULT_SECTIONS},
+        'data_start': data.index[0].isoformat() if len(data) else None,
+        'data_end': data.index[-1].isoformat() if len(data) else None,
+        'data_rows': len(data),
+        'data_hash': data_hash(data),
+        'code_version': code_version(),
+    }
+    canonical = json.dumps(description, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest(), description
+
+
+class ExperimentRegistry:
+    """
+    Store of backtest runs keyed by fingerprint:
+
+        {root}/index.jsonl                          one line per run: parameters and metrics
+        {root}/artifacts/{fp[:2]}/{fp}.npz          equity curve and positions of the run
+
+    The index is append-only and loaded into one DataFrame for queries, so thousands of runs
+    can be filtered and sorted without touching the artifacts.
+    """
+    def __init__(self, root='backtest_results/registry'):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.jsonl')
+        self._records = None
+
+    def _load(self):
+        if self._records is None:
+            self._records = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            record = json.loads(line)
+                            self._records[record['Fingerprint']] = record
+        return self._records
+
+    def artifact_path(self, fp):
+        return os.path.join(self.root, 'artifacts', fp[:2], f"{fp}.npz")
+
+    def __contains__(self, fp):
+        return fp in self._load()
+
+    def __len__(self):
+        return len(self._load())
+
+    def get(self, fp):
+        return self._load().get(fp)
+
+    def record(self, fp, description, performance, results, positions=None, robustness=None):
+        """
+        Store a finished run: its equity curve (and positions) as a compressed .npz artifact,
+        and one line with its flattened parameters and metrics in the index.
+        """
+        records = self._load()
+        if fp in records:
+            return records[fp]
+
+        path = self.artifact_path(fp)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {
+            'timestamp': results.index.as_unit('ns').asi8,
+            'total_asset': results.to_numpy(dtype=np.float64),
+        }
+        if positions is not None:
+            arrays['positions'] = positions.to_numpy().astype(np.int8)
+        np.savez_compressed(path, **arrays)
+
+        entry = {
+            'Fingerprint': fp,
+            'Recorded': datetime.now().isoformat(timespec='seconds'),
+            'Code Version': description['code_version'],
+            'Data Start': description['data_start'],
+            'Data End': description['data_end'],
+            'Data Rows': description['data_rows'],
+            'Data Hash': description['data_hash'],
+            'Parameters': flatten(description['config']),
+            'Performance': {key: float(value) for key, value in performance.items()},
+        }
+        if robustness is not None:
+            entry['Robustness'] = robustness
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.index_path, 'a') as f:
+            f.write(json.dumps(entry, default=str) + '\n')
+        records[fp] = entry
+        count(logger, 'registry_records', f"Experiment {fp[:12]} recorded in {self.root}.", fingerprint=fp)
+        return entry
+
+    def load_equity(self, fp):
+        """
+        Equity curve of a stored run as a Series indexed by timestamp.
+        """
+        with np.load(self.artifact_path(fp)) as artifact:
+            index = pd.DatetimeIndex(artifact['timestamp'].astype('datetime64[ns]'), name='date')
+            return pd.Series(artifact['total_asset'], index=index, name='total_asset')
+
+    def to_frame(self):
+        """
+        All runs as one DataFrame, one row per fingerprint, with parameters as 'param.<path>'
+        columns and metrics as their performance names.
+        """
+        rows = []
+        for fp, record in self._load().items():
+            row = {
+                'Fingerprint': fp,
+                'Recorded': record['Recorded'],
+                'Code Version': record['Code Version'],
+                'Data Start': record['Data Start'],
+                'Data End': record['Data End'],
+                'Data Rows': record['Data Rows'],
+            }
+            row.update({f"param.{key}": value for key, value in record['Parameters'].items()})
+            row.update(record['Performance'])
+            rows.append(row)
+        return pd.DataFrame(rows).set_index('Fingerprint') if rows else pd.DataFrame()
+
+    def query(self, filters=None, sort_by=None, ascending=False, limit=None):
+        """
+        Select runs from the index, e.g.
+
+            registry.query({'param.strategy.window': 10}, sort_by='Sharpe Ratio', limit=20)
+
+        Filter values are compared for equality, or called with the column if callable.
+        """
+        frame = self.to_frame()
+        if frame.empty:
+            return frame
+        mask = np.ones(len(frame), dtype=bool)
+        for column, value in (filters or {}).items():
+            if column not in frame:
+                return frame.iloc[0:0]
+            mask &= np.asarray(value(frame[column]) if callable(value) else frame[column] == value, dtype=bool)
+        frame = frame[mask]
+        if sort_by is not None:
+            frame = frame.sort_values(sort_by, ascending=ascending)
+        return frame.head(limit) if limit is not None else frame
+
+    def diff(self, fp_a, fp_b):
+        """
+        Parameters and metrics that differ between two runs, and how far apart their equity
+        curves are over the bars they have in common.
+        """
+        a, b = self.get(fp_a), self.get(fp_b)
+        parameters = {
+            key: (a['Parameters'].get(key), b['Parameters'].get(key))
+            for key in sorted(set(a['Parameters']) | set(b['Parameters']))
+            if a['Parameters'].get(key) != b['Parameters'].get(key)
+        }
+        for key in ('Code Version', 'Data Start', 'Data End', 'Data Rows', 'Data Hash'):
+            if a[key] != b[key]:
+                parameters[key] = (a[key], b[key])
+        performance = {
+            key: (a['Performance'].get(key), b['Performance'].get(key))
+            for key in sorted(set(a['Performance']) | set(b['Performance']))
+            if a['Performance'].get(key) != b['Performance'].get(key)
+        }
+
+        equity_a, equity_b = self.load_equity(fp_a), self.load_equity(fp_b)
+        common = equity_a.index.intersection(equity_b.index)
+        gap = (equity_a.loc[common] - equity_b.loc[common]).abs()
+        return {
+            'Parameters': parameters,
+            'Performance': performance,
+            'Common Bars': len(common),
+            'Max Equity Difference ($)': float(gap.max()) if len(common) else None,
+        }
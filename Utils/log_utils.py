@@ -0,0 +1,183 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and timers. Values are also attached to the log records that
+    update them, so operational metrics can be recovered from the JSON log alone.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timers = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            return self.counters[name]
+
+    def observe(self, name, seconds):
+        with self._lock:
+            count, total, maximum = self.timers.get(name, (0, 0.0, 0.0))
+            self.timers[name] = (count + 1, total + seconds, max(maximum, seconds))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timers': {
+                    name: {'count': count, 'total_s': total, 'mean_s': total / count, 'max_s': maximum}
+                    for name, (count, total, maximum) in self.timers.items()
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def timed(logger, name, message, level=logging.INFO, **fields):
+    """
+    Time a block, record it in the metrics registry and log one record carrying the timing.
+    The yielded dict can be filled with more fields (e.g. rows) inside the block.
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe(name, elapsed)
+        if logger.isEnabledFor(level):
+            fields = dict(fields, timer=name, elapsed_ms=elapsed * 1e3)
+            logger.log(level, message, extra={'metrics': fields})
+
+
+def count(logger, name, message, value=1, level=logging.INFO, **fields):
+    """
+    Increment a counter and log one record carrying its new total.
+    """
+    total = metrics.increment(name, value)
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={'metrics': dict(fields, counter=name, value=value, total=total)})
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, plus `metrics` and exception if present.
+    """
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='microseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        record_metrics = getattr(record, 'metrics', None)
+        if record_metrics:
+            entry['metrics'] = record_metrics
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TracebackQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the exception of a record. The stock prepare() merges the traceback
+    into the message and clears exc_info; here the message is resolved and the traceback
+    formatted into exc_text, so the listener's formatters still see it as an exception.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            # The traceback object holds every frame of the stack alive, so only its text is queued
+            record.exc_info = None
+        return record
+
+
+_listener = None
+_queue_handler = None
+
+
+def setup_logging(config=None):
+    """
+    Configure the package loggers from the `logging` config section.
+
+    Records are put on an in-memory queue by the calling thread and written by a background
+    QueueListener: JSON lines to `file` and plain text to the console at `console_level`.
+    Per-module levels can be set in `module_levels`, e.g. {'Data.data_loader': 'WARNING'}.
+    """
+    global _listener, _queue_handler
+    logging_config = (config or {}).get('logging') or {}
+    shutdown_logging(log_summary=False)
+
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    root.setLevel(logging_config.get('level', 'INFO'))
+
+    handlers = []
+    console = logging.StreamHandler()
+    console.setLevel(logging_config.get('console_level', 'INFO'))
+    console.setFormatter(logging.Formatter('%(message)s'))
+    handlers.append(console)
+
+    log_file = logging_config.get('file')
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setLevel(logging_config.get('file_level', 'DEBUG'))
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+
+    # The calling thread only enqueues records, formatting and file I/O happen on the listener thread
+    log_queue = queue.SimpleQueue()
+    _queue_handler = TracebackQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    for name, level in (logging_config.get('module_levels') or {}).items():
+        logging.getLogger(name).setLevel(level)
+    return _listener
+
+
+def shutdown_logging(log_summary=True):
+    """
+    Log a summary of all counters and timers, then flush and stop the background listener.
+    """
+    global _listener
+    if _listener is None:
+        return
+    if log_summary:
+        logging.getLogger(__name__).info('Metrics summary', extra={'metrics': metrics.snapshot()})
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.flush()
+        if isinstance(handler, logging.FileHandler):
+            handler.close()
+    _listener = None
+
+
+atexit.register(shutdown_logging)
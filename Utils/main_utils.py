@@ -1,7 +1,12 @@
 import json
+import logging
 import os
 import yaml
 
+from Utils.log_utils import count
+
+logger = logging.getLogger(__name__)
+
 
 def load_config(config_file='config.yaml'):
     with open(config_file, 'r') as file:
@@ -11,7 +16,8 @@ def load_config(config_file='config.yaml'):
 
 def is_duplicate(entry, results):
     """
-    Check if a given entry is already present in the results.
+    Check if a given entry is already present in the results. Entries that carry a run
+    fingerprint are compared by it; older entries without one by their parameters and metrics.
 
     Parameters:
     -----------
@@ -26,6 +32,10 @@ def is_duplicate(entry, results):
         True if the entry is a duplicate, False otherwise.
     """
     for result in results:
+        if 'Fingerprint' in entry and 'Fingerprint' in result:
+            if result['Fingerprint'] == entry['Fingerprint']:
+                return True
+            continue
         # Compare relevant fields
         if (
             result['Time Length (days)'] == entry['Time Length (days)'] and
@@ -43,9 +53,13 @@ def is_duplicate(entry, results):
     return False
 
 
-def save_backtest_results(config, performance, total_datapoints, result_dir):
+def save_backtest_results(config, performance, total_datapoints, result_dir, robustness=None, fingerprint=None, description=None):
     """
     Save the backtest results in JSON format for future reference.
+    If given, the robustness summary (bootstrap confidence intervals) is stored with the entry,
+    so it can be read back later without re-running the resamples. With a run fingerprint and
+    its description (see Utils.experiment_registry) the entry also records the data range and
+    code version, and duplicates are detected by fingerprint.
     """
 
     # Extract relevant data
@@ -53,7 +67,13 @@ def save_backtest_results(config, performance, total_datapoints, result_dir):
     time_length = config['data']['time_length_days']
     training_ratio = 1 - 1 / config['data']['training_threshold']
     testing_ratio =  1 / config['data']['training_threshold']
-    model = "Linear Regression"  # Assuming we are using linear regression model, adjust if necessary
+    model_config = config.get('model', {})
+    if len(config['data']['commodities']) > 2:
+        model = f"Basket {model_config.get('basket_method', 'OLS')}"
+    elif model_config.get('fitting_method') == 'Kalman':
+        model = "Kalman Filter"
+    else:
+        model = "Linear Regression"
     window = config['strategy']['window']
     threshold = config['strategy']['z_threshold']
     sharp_ratio = performance.get('Sharpe Ratio', None)
@@ -73,6 +93,13 @@ def save_backtest_results(config, performance, total_datapoints, result_dir):
         "Total Return ($)": total_r,
         "Annual Return (%)": annual_rr,
     }
+    if robustness is not None:
+        backtest_entry["Robustness"] = robustness
+    if fingerprint is not None:
+        backtest_entry["Fingerprint"] = fingerprint
+        backtest_entry["Data Start"] = description['data_start']
+        backtest_entry["Data End"] = description['data_end']
+        backtest_entry["Code Version"] = description['code_version']
 
     if os.path.exists(result_dir):
         # If exists, load the existing data
@@ -93,6 +120,6 @@ def save_backtest_results(config, performance, total_datapoints, result_dir):
         # Save the updated results back to the JSON file
         with open(result_dir, 'w') as f:
             json.dump(results, f, indent=4)
-        print(f"New backtest results appended to {result_dir}.")
+        count(logger, 'results_appended', f"New backtest results appended to {result_dir}.", path=result_dir)
     else:
-        print("Duplicate entry found. No new results were added.")
\ No newline at end of file
+        count(logger, 'results_duplicates', "Duplicate entry found. No new results were added.", path=result_dir)
\ No newline at end of file
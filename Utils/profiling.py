@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class StageRecord:
+    """
+    Measurements for one pipeline stage. Callers may set `rows` inside the stage.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.memory_delta = None
+        self.memory_peak = None
+        self.profile = None
+
+    def to_dict(self):
+        return {
+            'Stage': self.name,
+            'Wall Time (s)': self.wall_time,
+            'CPU Time (s)': self.cpu_time,
+            'Rows': self.rows,
+            'Rows per Second': self.rows / self.wall_time if self.rows and self.wall_time > 0 else None,
+            'Memory Delta (MB)': self.memory_delta,
+            'Memory Peak (MB)': self.memory_peak,
+        }
+
+
+class StageProfiler:
+    """
+    Records wall time, CPU time, rows processed and memory deltas for named pipeline stages,
+    and optionally a cProfile of each stage, of which the hottest one ends up in the report.
+    """
+    def __init__(self, run_name='backtest', trace_memory=True, cprofile=False, top_n=25):
+        self.run_name = run_name
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.top_n = top_n
+        self.records = []
+        self.started = datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        # Tracing is only stopped again if this profiler turned it on
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def stop(self):
+        """
+        Stop memory tracing if this profiler started it. Later stages record no memory.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        record = StageRecord(name)
+        profiler = None
+        if self.cprofile:
+            import cProfile
+            profiler = cProfile.Profile()
+        trace_memory = self.trace_memory and tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record.wall_time = time.perf_counter() - wall
+            record.cpu_time = time.process_time() - cpu
+            if trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record.memory_delta = (current - memory_before) / 2 ** 20
+                record.memory_peak = (peak - memory_before) / 2 ** 20
+            record.profile = profiler
+            self.records.append(record)
+
+    def _hottest_profile(self):
+        profiled = [record for record in self.records if record.profile is not None]
+        if not profiled:
+            return None
+        import pstats
+
+        hottest = max(profiled, key=lambda record: record.wall_time)
+        stats = pstats.Stats(hottest.profile)
+        functions = []
+        for (filename, line, function), (_, calls, _, cumulative, _) in stats.stats.items():
+            functions.append({
+                'Function': f"{os.path.basename(filename)}:{line}({function})",
+                'Calls': calls,
+                'Cumulative Time (s)': cumulative,
+            })
+        functions.sort(key=lambda entry: entry['Cumulative Time (s)'], reverse=True)
+        return {'Stage': hottest.name, 'Functions': functions[:self.top_n]}
+
+    def report(self, metadata=None):
+        """
+        Totals and per-stage measurements of the run so far. Ends memory tracing (see stop).
+        """
+        self.stop()
+        return {
+            'Run': self.run_name,
+            'Started': self.started.isoformat(timespec='seconds'),
+            'Total Wall Time (s)': time.perf_counter() - self._start_wall,
+            'Total CPU Time (s)': time.process_time() - self._start_cpu,
+            'Stages': [record.to_dict() for record in self.records],
+            'Hottest Stage Profile': self._hottest_profile(),
+            'Metadata': metadata or {},
+        }
+
+    def save(self, output_dir, metadata=None):
+        """
+        Write the report of this run to its own JSON file and append it as one line to
+        profiles.jsonl in the same directory, so runs can be compared over time.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        report = self.report(metadata)
+        filename = os.path.join(output_dir, f"profile_{self.run_name}_{self.started.strftime('%Y%m%d_%H%M%S_%f')}.json")
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=4, default=str)
+        with open(os.path.join(output_dir, 'profiles.jsonl'), 'a') as f:
+            f.write(json.dumps(report, default=str) + '\n')
+        logger.info(f"Profiling report saved to {filename}")
+        return filename
+
+
+class NullProfiler:
+    """
+    Stand-in used when profiling is off: stages cost one method call and record nothing.
+    """
+    def stage(self, name):
+        return nullcontext(StageRecord(name))
+
+    def save(self, output_dir, metadata=None):
+        return None
@@ -1,15 +1,66 @@
-import pprint
+import argparse
+import copy
+import logging
+import os
+import subprocess
 import sys
-from ib_insync import *
-import pandas as pd
 from datetime import datetime, timedelta
 
-from PortfolioManagement.portfolio_manager import PortfolioManager
-from Data.data_loader import DataLoader
-from RegressionModel.regression_model import RegressionModel
-from Strategy.strategy import PairTradingStrategy
-from Backtesting.backtesting import Backtester
 from Utils.main_utils import save_backtest_results, load_config
+from Utils.log_utils import setup_logging
+
+# Heavy dependencies (pandas, ib_insync, statsmodels, matplotlib) are imported inside the
+# sub-command that needs them, so an offline backtest never pays for IB or plotting imports.
+HEAVY_MODULES = ('ib_insync', 'statsmodels', 'matplotlib')
+
+logger = logging.getLogger(__name__)
+
+
+def build_risk_engine(config, symbols=None):
+    """
+    Create a RiskEngine from the `risk` section of the config, or None if risk checks are disabled.
+    """
+    risk_config = config.get('risk') or {}
+    if not risk_config.get('enabled', False):
+        return None
+
+    from RiskManagement.risk_engine import RiskEngine, RiskLimits
+
+    return RiskEngine(
+        list(config['data']['commodities'] if symbols is None else symbols),
+        config['capital']['initial_capital'],
+        RiskLimits.from_config(risk_config)
+    )
+
+
+def build_profiler(config, run_name):
+    """
+    Create a StageProfiler when the `profiling` section of the config enables it, else a no-op profiler.
+    """
+    from Utils.profiling import StageProfiler, NullProfiler
+
+    profiling_config = config.get('profiling') or {}
+    if not profiling_config.get('enabled', False):
+        return NullProfiler()
+    return StageProfiler(
+        run_name=run_name,
+        trace_memory=profiling_config.get('trace_memory', True),
+        cprofile=profiling_config.get('cprofile', False),
+        top_n=profiling_config.get('top_n', 25)
+    )
+
+
+def build_registry(config):
+    """
+    Open the ExperimentRegistry from the `registry` section of the config, or None if it is disabled.
+    """
+    registry_config = config.get('registry') or {}
+    if not registry_config.get('enabled', False):
+        return None
+
+    from Utils.experiment_registry import ExperimentRegistry
+
+    return ExperimentRegistry(registry_config.get('root', 'backtest_results/registry'))
 
 
 def backtest(
@@ -18,10 +69,16 @@ def backtest(
         json_dir: str,
         end_date: datetime = datetime.now() - timedelta(days=5)
     ):
+    import pandas as pd
+
+    from Data.data_loader import DataLoader
+    from RegressionModel.regression_model import RegressionModel
+    from Strategy.strategy import PairTradingStrategy, BasketTradingStrategy
+    from Backtesting.backtesting import Backtester, BasketBacktester
+
     # Import configuration
     time_scale = config['data']['time_length_days']
-    commodity1 = config['data']['commodities'][0]
-    commodity2 = config['data']['commodities'][1]
+    commodities = config['data']['commodities']
     bar_size = config['data']['time_scale']
     window = config['strategy']['window']
     z_threshold = config['strategy']['z_threshold']
@@ -31,82 +88,566 @@ def backtest(
     client_id = config['credentials']['client_id']
     training_threshold = config['data']['training_threshold']
     time = config['data']['time_scale']
+    profiler = build_profiler(config, 'backtest')
+    # Session handling: rolling statistics reset or carried over each day, flat at the close
+    session_config = config.get('session') or {}
+    sessions = session_config.get('rolling', 'reset') if session_config.get('enabled', False) else None
+    flatten_time = session_config.get('flatten_time')
+    if sessions is not None and bar_size == '1 day':
+        # Every daily bar closes its session, flattening on it would leave the strategy always flat
+        logger.warning("Session mode needs intraday bars, ignoring session settings for 1 day bars.")
+        sessions, flatten_time = None, None
+    # More than two commodities are traded as one basket spread
+    basket = len(commodities) > 2
 
     # Define date range
     start_date = end_date - timedelta(days=time_scale)
 
     # Initialize DataLoader
-    data_loader = DataLoader(ib_port=ib_port, client_id=client_id, data_dir='Data/commodity_data/')
-    # Fetch data for GLD
-    commodity_1_data = data_loader.fetch_data(
-        symbol=commodity1,
-        start_date=start_date,
-        end_date=end_date,
-        bar_size=bar_size,
-        what_to_show='TRADES',
-        use_rth=True
-    )
-    # Fetch data for GDX
-    commodity_2_data = data_loader.fetch_data(
-        symbol=commodity2,
-        start_date=start_date,
-        end_date=end_date,
-        bar_size=bar_size,
-        what_to_show='TRADES',
-        use_rth=True
-    )
+    data_loader = DataLoader(ib_port=ib_port, client_id=client_id, data_dir='Data/commodity_data/', profiler=profiler)
+    commodity_data = []
+    for commodity in commodities:
+        if config['data'].get('quotes', False):
+            # Spread from midpoints, execution at bid/ask
+            commodity_data.append(data_loader.fetch_quotes(commodity, start_date, end_date, bar_size=bar_size, use_rth=True))
+        else:
+            commodity_data.append(data_loader.fetch_data(
+                symbol=commodity,
+                start_date=start_date,
+                end_date=end_date,
+                bar_size=bar_size,
+                what_to_show='TRADES',
+                use_rth=True
+            ))
 
     # Merge data
-    data = pd.concat([commodity_1_data, commodity_2_data], axis=1).dropna()
+    with profiler.stage('merge') as stage:
+        data = pd.concat(commodity_data, axis=1).dropna()
+        stage.rows = len(data)
 
     # Split data into training and testing
     training_data = data.iloc[:-int(len(data) / training_threshold)]
     testing_data = data.iloc[-int(len(data) / training_threshold):]
 
+    # Skip runs whose config, input bars and code are unchanged since they were recorded
+    registry = build_registry(config)
+    fp, description = None, None
+    if registry is not None:
+        from Utils.experiment_registry import fingerprint
+
+        with profiler.stage('fingerprint') as stage:
+            fp, description = fingerprint(config, data)
+            stage.rows = len(data)
+        if fp in registry:
+            # Only the fit and simulation are skipped, the run is still written to this json_dir
+            stored = registry.get(fp)
+            performance = stored['Performance']
+            print(f"Backtest {fp[:12]} already in registry, skipping:")
+            for key, value in performance.items():
+                print(f"{key}: {value}")
+            save_backtest_results(config, performance, len(training_data) + len(testing_data), json_dir,
+                                  robustness=stored.get('Robustness'), fingerprint=fp, description=description)
+            return performance
+
     # Regression Model
-    regression_model = RegressionModel(training_data)
-    hedge_ratio, alpha = regression_model.linear_fit()
+    with profiler.stage('fit') as stage:
+        regression_model = RegressionModel(training_data)
+        if basket:
+            hedge_ratio, alpha = regression_model.basket_fit(commodities, method=config['model'].get('basket_method', 'OLS'))
+            stage.rows = len(training_data)
+        elif config['model'].get('fitting_method', 'OLS') == 'Kalman':
+            # Causal filter over the whole history, the training split is the burn-in
+            hedge_ratio, alpha = regression_model.kalman_fit(
+                data,
+                delta=config['model']['kalman_delta'],
+                observation_variance=config['model']['kalman_observation_variance']
+            )
+            hedge_ratio, alpha = hedge_ratio.loc[testing_data.index], alpha.loc[testing_data.index]
+            stage.rows = len(data)
+        else:
+            hedge_ratio, alpha = regression_model.linear_fit()
+            stage.rows = len(training_data)
 
     # Strategy
-    strategy = PairTradingStrategy(testing_data, hedge_ratio=hedge_ratio, alpha=alpha, window=window, z_threshold=z_threshold)
-    signals = strategy.generate_signals()
+    with profiler.stage('signals') as stage:
+        if basket:
+            strategy = BasketTradingStrategy(testing_data, weights=hedge_ratio, alpha=alpha, window=window, z_threshold=z_threshold,
+                                             sessions=sessions, flatten_time=flatten_time)
+        else:
+            strategy = PairTradingStrategy(testing_data, hedge_ratio=hedge_ratio, alpha=alpha, window=window, z_threshold=z_threshold,
+                                           sessions=sessions, flatten_time=flatten_time)
+        signals = strategy.generate_signals()
+        stage.rows = len(testing_data)
 
     # Backtesting
-    backtester = Backtester(testing_data, signals, hedge_ratio, alpha, initial_capital=initial_capital, transaction_cost=transaction_cost)
-    backtester.run_backtest()
-    if time == '1 min':
-        performance = backtester.evaluate_minute_performance()
-    elif time == '1 day':
-        performance = backtester.evaluate_day_performance()
+    with profiler.stage('simulation') as stage:
+        if basket:
+            backtester = BasketBacktester(testing_data, signals, hedge_ratio, alpha, initial_capital=initial_capital, transaction_cost=transaction_cost)
+        else:
+            risk_engine = build_risk_engine(config)
+            backtester = Backtester(testing_data, signals, hedge_ratio, alpha, initial_capital=initial_capital, transaction_cost=transaction_cost, risk_engine=risk_engine)
+        backtester.run_backtest(engine=config.get('backtest', {}).get('engine', 'loop'))
+        stage.rows = len(testing_data)
+
+    with profiler.stage('metrics') as stage:
+        if time == '1 min':
+            performance = backtester.evaluate_minute_performance()
+        elif time == '1 day':
+            performance = backtester.evaluate_day_performance()
+        stage.rows = len(testing_data)
 
     print("Backtest Performance:")
     for key, value in performance.items():
         print(f"{key}: {value}")
 
+    robustness = None
+    robustness_config = config.get('robustness') or {}
+    if robustness_config.get('enabled', False):
+        with profiler.stage('robustness') as stage:
+            robustness = backtester.evaluate_robustness(
+                bar_size=time,
+                n_resamples=robustness_config.get('n_resamples', 2000),
+                block_size=robustness_config.get('block_size'),
+                confidence=robustness_config.get('confidence', 0.95),
+                seed=robustness_config.get('seed', 0),
+                n_jobs=robustness_config.get('n_jobs', 1)
+            )
+            stage.rows = robustness_config.get('n_resamples', 2000) * len(testing_data)
+        for method in ('Block Bootstrap', 'Synthetic Paths'):
+            for metric, interval in robustness[method].items():
+                print(f"{method} {metric}: {interval}")
+
     # Plot returns and positions and save
     # backtester.data.to_csv(result_dir, index=True)
     total_datapoints = len(training_data) + len(testing_data)
-    save_backtest_results(config, performance, total_datapoints, json_dir)
+    with profiler.stage('results write') as stage:
+        save_backtest_results(config, performance, total_datapoints, json_dir, robustness=robustness, fingerprint=fp, description=description)
+        if registry is not None:
+            registry.record(fp, description, performance, backtester.results, positions=backtester.positions, robustness=robustness)
+        stage.rows = 1
     # backtester.plot_results()
     # backtester.plot_positions()
 
+    profiler.save(
+        (config.get('profiling') or {}).get('output_dir', 'backtest_results/profiles'),
+        metadata={
+            'Commodities': config['data']['commodities'],
+            'Bar Size': bar_size,
+            'Time Length (days)': time_scale,
+            'Window': window,
+            'Threshold': z_threshold,
+            'Model': config['model'].get('fitting_method', 'OLS'),
+            'Engine': config.get('backtest', {}).get('engine', 'loop'),
+            'Total Data Points': total_datapoints,
+            'Fingerprint': fp,
+        }
+    )
+    return performance
 
-def paper_trade():
-    # Portfolio Management (Commented out to prevent real trades)
-    # ib = IB()
-    # ib.connect('127.0.0.1', 7497, clientId=1)
-    # portfolio_manager = PortfolioManager(ib, hedge_ratio, alpha)
-    # for index, signal in signals['positions'].iteritems():
-    #     portfolio_manager.rebalance(signal)
-    # ib.disconnect()
-    pass
+
+def sweep(config, results_dir='backtest_results'):
+    """
+    Run the one-parameter-at-a-time sweep from script.py inside this process.
+    Every run gets its own copy of the config, so config.yaml is never rewritten.
+    """
+    from script import sweep_configs
+
+    for name, value, run_config, json_path in sweep_configs(config):
+        print(f"Running backtest with {name} = {value}...")
+        backtest(config=run_config, result_dir=results_dir, json_dir=json_path)
+
+
+def cross_validate(config, output_path='backtest_results/json/cross_validation.json',
+                   end_date: datetime = datetime.now() - timedelta(days=5)):
+    """
+    Score the window x z_threshold grid from script.py with purged time-series cross-validation
+    over the whole history, instead of the single training_threshold split, and write the
+    per-parameter summary (mean, spread and worst fold Sharpe ratio) to output_path.
+    """
+    import json
+
+    import pandas as pd
+
+    from Data.data_loader import DataLoader
+    from Backtesting.cross_validation import CrossValidator, purged_kfold_splits, combinatorial_purged_splits
+    from script import PARAMETER_GRID
+
+    cv_config = config.get('cross_validation') or {}
+    bar_size = config['data']['time_scale']
+    start_date = end_date - timedelta(days=config['data']['time_length_days'])
+    data_loader = DataLoader(
+        ib_port=config['credentials']['ib_port'],
+        client_id=config['credentials']['client_id'],
+        data_dir='Data/commodity_data/'
+    )
+    data = pd.concat([
+        data_loader.fetch_data(symbol, start_date, end_date, bar_size=bar_size, what_to_show='TRADES', use_rth=True)
+        for symbol in config['data']['commodities']
+    ], axis=1).dropna()
+
+    windows = PARAMETER_GRID['window']
+    z_thresholds = PARAMETER_GRID['z_threshold']
+    # By default no training bar shares a rolling window with a test bar
+    purge = cv_config.get('purge') or max(windows)
+    embargo = cv_config.get('embargo', 0)
+    if cv_config.get('method', 'kfold') == 'combinatorial':
+        splits = combinatorial_purged_splits(
+            len(data), cv_config.get('n_groups', 6), cv_config.get('n_test_groups', 2), purge=purge, embargo=embargo
+        )
+    else:
+        splits = purged_kfold_splits(len(data), cv_config.get('n_splits', 5), purge=purge, embargo=embargo)
+
+    validator = CrossValidator(data, config['capital']['initial_capital'], config['capital']['transaction_cost'],
+                               bar_size=bar_size, symbols=config['data']['commodities'])
+    folds, summary = validator.evaluate(splits, windows, z_thresholds, n_jobs=cv_config.get('n_jobs', 1))
+
+    print(f"Cross-Validation ({len(splits)} splits, {len(summary)} parameter sets):")
+    print(summary.head(10).to_string(index=False))
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(summary.to_dict(orient='records'), f, indent=4)
+    return folds, summary
+
+
+def fetch(config, end_date: datetime = datetime.now() - timedelta(days=5)):
+    """
+    Warm the local cache for the configured commodities without running a backtest.
+    """
+    from Data.data_loader import DataLoader
+
+    start_date = end_date - timedelta(days=config['data']['time_length_days'])
+    data_loader = DataLoader(
+        ib_port=config['credentials']['ib_port'],
+        client_id=config['credentials']['client_id'],
+        data_dir='Data/commodity_data/'
+    )
+    for symbol in config['data']['commodities']:
+        data_loader.fetch_data(
+            symbol=symbol,
+            start_date=start_date,
+            end_date=end_date,
+            bar_size=config['data']['time_scale'],
+            what_to_show='TRADES',
+            use_rth=True
+        )
+        if config['data'].get('quotes', False):
+            data_loader.fetch_quotes(symbol, start_date, end_date, bar_size=config['data']['time_scale'], use_rth=True)
+        if config['data'].get('ticks', False):
+            data_loader.fetch_ticks(symbol, start_date, end_date, what_to_show='BID_ASK', use_rth=True)
+
+
+def fit_streaming_model(config, training_data, symbols=('GLD', 'GDX')):
+    """
+    Initial hedge ratio and alpha for bar-by-bar trading. With the Kalman model the filter is
+    run over the training bars and returned as well, to keep updating it on live bars.
+
+    Returns:
+    --------
+    tuple of (float, float, KalmanHedgeRatio or None)
+    """
+    from RegressionModel.regression_model import RegressionModel
+
+    target, hedge = symbols
+    if config['model'].get('fitting_method', 'OLS') == 'Kalman':
+        from RegressionModel.kalman_filter import KalmanHedgeRatio
+
+        kalman = KalmanHedgeRatio(config['model']['kalman_delta'], config['model']['kalman_observation_variance'])
+        for price_target, price_hedge in training_data[[target, hedge]].itertuples(index=False):
+            kalman.update(price_target, price_hedge)
+        return kalman.hedge_ratio, kalman.alpha, kalman
+
+    # linear_fit regresses the GLD column on the GDX column
+    training_data = training_data[[target, hedge]].set_axis(['GLD', 'GDX'], axis=1)
+    hedge_ratio, alpha = RegressionModel(training_data).linear_fit()
+    return hedge_ratio, alpha, None
+
+
+def paper_trade(config, speed=None, end_date: datetime = datetime.now() - timedelta(days=5)):
+    """
+    Paper trade against the local replay exchange instead of a live IB connection.
+    The hedge ratio is fitted on the training split of the cached bars, then the testing
+    split is replayed bar by bar through strategy -> PortfolioManager -> simulated fills.
+    """
+    import pandas as pd
+
+    from Data.data_loader import DataLoader
+    from Strategy.strategy import StreamingPairTradingStrategy
+    from PortfolioManagement.portfolio_manager import PortfolioManager
+    from Simulation.replay_exchange import ReplayIB
+
+    commodities = config['data']['commodities']
+    bar_size = config['data']['time_scale']
+    training_threshold = config['data']['training_threshold']
+    start_date = end_date - timedelta(days=config['data']['time_length_days'])
+
+    data_loader = DataLoader(
+        ib_port=config['credentials']['ib_port'],
+        client_id=config['credentials']['client_id'],
+        data_dir='Data/commodity_data/'
+    )
+    data = pd.concat([
+        data_loader.fetch_data(symbol, start_date, end_date, bar_size=bar_size, what_to_show='TRADES', use_rth=True)
+        for symbol in commodities
+    ], axis=1).dropna()
+    training_data = data.iloc[:-int(len(data) / training_threshold)]
+    testing_data = data.iloc[-int(len(data) / training_threshold):]
+
+    hedge_ratio, alpha, kalman = fit_streaming_model(config, training_data)
+
+    ib = ReplayIB(
+        testing_data,
+        speed=speed,
+        bar_interval=86400 if bar_size == '1 day' else 60,
+        commission_per_share=config['capital']['transaction_cost']
+    )
+    ib.connect('127.0.0.1', config['credentials']['ib_port'], clientId=config['credentials']['client_id'])
+    ib.cash = config['capital']['initial_capital']
+
+    strategy = StreamingPairTradingStrategy(
+        hedge_ratio, alpha,
+        z_threshold=config['strategy']['z_threshold'],
+        window=config['strategy']['window']
+    )
+    risk_engine = build_risk_engine(config)
+    portfolio_manager = PortfolioManager(ib, hedge_ratio, risk_engine=risk_engine)
+    for timestamp, prices in ib.replay():
+        if kalman is not None:
+            hedge_ratio, alpha = kalman.update(prices['GLD'], prices['GDX'])
+            portfolio_manager.hedge_ratio = hedge_ratio
+            signal = strategy.update(prices['GLD'], prices['GDX'], hedge_ratio=hedge_ratio, alpha=alpha)
+        else:
+            signal = strategy.update(prices['GLD'], prices['GDX'])
+        if risk_engine is not None:
+            for symbol, price in prices.items():
+                risk_engine.on_price(symbol, price, timestamp)
+            if risk_engine.should_flatten(timestamp):
+                portfolio_manager.close_positions()
+                continue
+        portfolio_manager.rebalance(signal)
+    portfolio_manager.close_positions()
+    ib.disconnect()
+
+    print("Paper Trading Performance:")
+    print(f"Final Net Liquidation ($): {ib.net_liquidation()}")
+    if risk_engine is not None:
+        for key, value in risk_engine.snapshot().items():
+            print(f"{key}: {value}")
+    for key, value in ib.stats().items():
+        print(f"{key}: {value}")
+    return ib
+
+
+def serve(config_path, replay=False, speed=None, end_date: datetime = datetime.now() - timedelta(days=5)):
+    """
+    Run the multi-pair strategy service on one IB connection until it is stopped (SIGINT / SIGTERM),
+    or on the replay exchange until the replay ends. config_path is watched and hot-reloaded.
+    Each pair's hedge ratio is fitted on the cached bars before the replay (or live) start.
+    """
+    import asyncio
+    import signal
+
+    import pandas as pd
+
+    from Data.data_loader import DataLoader
+    from Service.strategy_service import StrategyService, PairRunner, ReplaySource, IBSource, pair_configs
+
+    config = load_config(config_path)
+    bar_size = config['data']['time_scale']
+    start_date = end_date - timedelta(days=config['data']['time_length_days'])
+    data_loader = DataLoader(
+        ib_port=config['credentials']['ib_port'],
+        client_id=config['credentials']['client_id'],
+        data_dir='Data/commodity_data/'
+    )
+
+    def cached_history(symbols):
+        return pd.concat([
+            data_loader.fetch_data(symbol, start_date, end_date, bar_size=bar_size, what_to_show='TRADES', use_rth=True)
+            for symbol in symbols
+        ], axis=1).dropna()
+
+    async def history(symbols):
+        if replay:
+            return cached_history(symbols)
+        # Live, missing bars come over the service's own connection without blocking the loop
+        return pd.concat([
+            await data_loader.fetch_data_async(ib, symbol, start_date, end_date, bar_size=bar_size, what_to_show='TRADES', use_rth=True)
+            for symbol in symbols
+        ], axis=1).dropna()
+
+    replay_start = None
+    if replay:
+        from Simulation.replay_exchange import ReplayIB
+
+        # The replay serves the symbols of the pairs configured at start
+        symbols = sorted({symbol for pair in pair_configs(config).values() for symbol in pair['symbols']})
+        data = cached_history(symbols)
+        replay_start = data.index[-int(len(data) / config['data']['training_threshold'])]
+        ib = ReplayIB(
+            data[data.index >= replay_start],
+            speed=speed,
+            bar_interval=86400 if bar_size == '1 day' else 60,
+            commission_per_share=config['capital']['transaction_cost']
+        )
+        ib.cash = config['capital']['initial_capital']
+        source = ReplaySource(ib)
+    else:
+        from ib_insync import IB, util
+
+        # PortfolioManager uses the blocking ib_insync calls from inside the event loop
+        util.patchAsyncio()
+        ib = IB()
+        source = IBSource(ib, bar_size=bar_size)
+
+    # One RiskEngine for all pairs, so the limits and the initial capital apply to the whole book
+    risk_engine = build_risk_engine(config, [])
+
+    async def build_pair(name, settings):
+        training_data = await history(settings['symbols'])
+        if replay_start is not None:
+            training_data = training_data[training_data.index < replay_start]
+        hedge_ratio, alpha, kalman = fit_streaming_model(config, training_data, settings['symbols'])
+        if risk_engine is not None:
+            risk_engine.add_symbols(settings['symbols'])
+        return PairRunner(name, settings, ib, hedge_ratio, alpha, kalman=kalman, risk_engine=risk_engine)
+
+    service = StrategyService(
+        config_path, source, build_pair,
+        reload_interval=(config.get('service') or {}).get('reload_interval', 1.0)
+    )
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, service.stop)
+        if replay:
+            ib.connect('127.0.0.1', config['credentials']['ib_port'], clientId=config['credentials']['client_id'])
+        else:
+            await ib.connectAsync('127.0.0.1', config['credentials']['ib_port'], clientId=config['credentials']['client_id'])
+        try:
+            await service.run()
+        finally:
+            ib.disconnect()
+
+    asyncio.run(run())
+
+    print("Strategy Service Summary:")
+    print(f"Bars Processed: {service.bars}")
+    for name, runner in service.runners.items():
+        print(f"{name} Bars: {runner.bars}")
+    if risk_engine is not None:
+        for key, value in risk_engine.snapshot().items():
+            print(f"{key}: {value}")
+    if replay:
+        print(f"Final Net Liquidation ($): {ib.net_liquidation()}")
+        for key, value in ib.stats().items():
+            print(f"{key}: {value}")
+    return service
 
 
 def live_trade():
     pass
 
 
+def check_startup(budget):
+    """
+    Import the offline backtest stack in a fresh interpreter and compare the time against a budget.
+
+    Returns:
+    --------
+    bool
+        True if the imports fit in the budget and no heavy module was pulled in.
+    """
+    probe = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        "import main\n"
+        "import pandas\n"
+        "from Data.data_loader import DataLoader\n"
+        "from RegressionModel.regression_model import RegressionModel\n"
+        "from Strategy.strategy import PairTradingStrategy\n"
+        "from Backtesting.backtesting import Backtester\n"
+        "print(time.perf_counter() - t)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+    lines = output.rstrip('\n').split('\n')
+    elapsed = float(lines[0])
+    loaded = lines[1] if len(lines) > 1 else ''
+
+    print(f"Offline backtest import time: {elapsed:.3f}s (budget {budget:.3f}s)")
+    if loaded:
+        print(f"Heavy modules imported on the offline path: {loaded}")
+    return elapsed <= budget and not loaded
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='GLD/GDX pair trading strategy')
+    parser.add_argument('--config', default='config.yaml', help='Path to the YAML config file')
+    parser.add_argument('--profile', action='store_true', help='Record a per-stage timing report for this run')
+    parser.add_argument('--cprofile', action='store_true', help='With --profile, also keep a cProfile of the hottest stage')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backtest_parser = subparsers.add_parser('backtest', help='Run a single offline backtest')
+    backtest_parser.add_argument('result_dir', help='Path for the per-bar results')
+    backtest_parser.add_argument('json_dir', help='JSON file the performance summary is appended to')
+
+    sweep_parser = subparsers.add_parser('sweep', help='Run the parameter sweep in-process')
+    sweep_parser.add_argument('--results-dir', default='backtest_results')
+
+    cv_parser = subparsers.add_parser('cv', help='Score the parameter grid with purged time-series cross-validation')
+    cv_parser.add_argument('--output', default='backtest_results/json/cross_validation.json')
+
+    subparsers.add_parser('fetch', help='Download missing bars into the local cache')
+    paper_parser = subparsers.add_parser('paper', help='Paper trade the strategy on the local replay exchange')
+    paper_parser.add_argument('--speed', type=float, default=None,
+                              help='Replay speed: 1 for real time, N for N times faster, omit for as fast as possible')
+    subparsers.add_parser('live', help='Not implemented yet, use serve to trade live')
+    serve_parser = subparsers.add_parser('serve', help='Run several pairs as a long-running service with hot-reloaded config')
+    serve_parser.add_argument('--replay', action='store_true', help='Trade on the local replay exchange instead of IB')
+    serve_parser.add_argument('--speed', type=float, default=None,
+                              help='With --replay: 1 for real time, N for N times faster, omit for as fast as possible')
+
+    startup_parser = subparsers.add_parser('startup', help='Check offline backtest import time')
+    startup_parser.add_argument('--budget', type=float, default=1.0, help='Import time budget in seconds')
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = ('backtest', 'sweep', 'cv', 'fetch', 'paper', 'live', 'serve', 'startup')
+    # Keep the old `python main.py <result_dir> <json_dir>` form working
+    if len(argv) == 2 and not argv[0].startswith('-') and argv[0] not in commands:
+        argv = ['backtest'] + argv
+
+    args = build_parser().parse_args(argv)
+    if args.command == 'startup':
+        return 0 if check_startup(args.budget) else 1
+    if args.command == 'live':
+        # live_trade() is still a stub; exiting 0 would look like a successful run
+        print("Live trading is not implemented; use `serve`.", file=sys.stderr)
+        return 1
+
+    config = load_config(args.config)
+    setup_logging(config)
+    if args.profile or args.cprofile:
+        config.setdefault('profiling', {})
+        config['profiling']['enabled'] = True
+        config['profiling']['cprofile'] = config['profiling'].get('cprofile', False) or args.cprofile
+    if args.command == 'backtest':
+        backtest(config=config, result_dir=args.result_dir, json_dir=args.json_dir)
+    elif args.command == 'sweep':
+        sweep(config=copy.deepcopy(config), results_dir=args.results_dir)
+    elif args.command == 'cv':
+        cross_validate(config, output_path=args.output)
+    elif args.command == 'fetch':
+        fetch(config)
+    elif args.command == 'paper':
+        paper_trade(config, speed=args.speed)
+    elif args.command == 'serve':
+        serve(args.config, replay=args.replay, speed=args.speed)
+    return 0
+
+
 if __name__ == "__main__":
-    config = load_config()
-    # backtest(config=config, result_dir='Output/tt.json', json_dir='Output/tt.json')
-    backtest(config=config, result_dir=sys.argv[1], json_dir=sys.argv[2])
+    sys.exit(main())
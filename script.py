@@ -1,97 +1,55 @@
-import time
+import copy
 import yaml
-import subprocess
 import os
 
 
+# 定义参数范围
+PARAMETER_GRID = {
+    'window': [i for i in range(5, 51, 5)] + [i for i in range(60, 150, 10)] + [390, 1950],
+    'z_threshold': [1, 1.5, 2, 2.5, 3],
+    'time_length_days': [15] + [i for i in range(30, 361, 10)],
+    'training_threshold': [1.5, 2, 3, 5, 10],
+}
+
+# 每个参数所在的 config 小节，以及结果写入的 JSON 文件
+PARAMETER_SECTIONS = {
+    'window': ('strategy', 'backtest_results/json/window.json'),
+    'z_threshold': ('strategy', 'backtest_results/json/z_threshold.json'),
+    'time_length_days': ('data', 'backtest_results/json/time_length.json'),
+    'training_threshold': ('data', 'backtest_results/json/threshold.json'),
+}
+
+
+def sweep_configs(config):
+    """
+    Yield (parameter, value, config, json_path) for the one-parameter-at-a-time sweep.
+    Each yielded config is an independent copy, so nothing is written back to config.yaml.
+    """
+    # 控制变量法：一次只改变一个参数，其他参数保持默认值
+    for name, values in PARAMETER_GRID.items():
+        section, json_path = PARAMETER_SECTIONS[name]
+        for value in values:
+            run_config = copy.deepcopy(config)
+            run_config[section][name] = value
+            yield name, value, run_config, json_path
+
+
 def run_backtests():
     config_file = 'config.yaml'
 
     with open(config_file, 'r') as file:
         config = yaml.safe_load(file)
 
-    # 定义参数范围
-    window_values = [i for i in range(5, 51, 5)] + [i for i in range(60, 150, 10)] + [390, 1950]
-    z_threshold_values = [1, 1.5, 2, 2.5, 3]
-    time_length_days_values = [15] + [i for i in range(30, 361, 10)]
-    training_threshold_values = [1.5, 2, 3, 5, 10]
-
     # 创建保存结果的目录
     results_dir = 'backtest_results'
     if not os.path.exists(results_dir):
         os.makedirs(results_dir)
 
-    # 控制变量法：一次只改变一个参数，其他参数保持默认值
-    default_params = {
-        'window': config['strategy']['window'],
-        'z_threshold': config['strategy']['z_threshold'],
-        'time_length_days': config['data']['time_length_days'],
-        'training_threshold': config['data']['training_threshold'],
-    }
-
-    # 测试 window 参数
-    for window in window_values:
-        config['strategy']['window'] = window
-        config['strategy']['z_threshold'] = default_params['z_threshold']
-        config['data']['time_length_days'] = default_params['time_length_days']
-        config['data']['training_threshold'] = default_params['training_threshold']
-
-        with open(config_file, 'w') as file:
-            yaml.dump(config, file)
-
-        print(f"Running backtest with window = {window}...")
-        result_name = f"result_window_{window}.csv"
-        subprocess.run(['python3', 'main.py', os.path.join(results_dir, result_name), "backtest_results/json/window.json"])
-
-        time.sleep(3)
-
-    # 测试 z_threshold 参数
-    for z_threshold in z_threshold_values:
-        config['strategy']['window'] = default_params['window']
-        config['strategy']['z_threshold'] = z_threshold
-        config['data']['time_length_days'] = default_params['time_length_days']
-        config['data']['training_threshold'] = default_params['training_threshold']
-
-        with open(config_file, 'w') as file:
-            yaml.dump(config, file)
-
-        print(f"Running backtest with z_threshold = {z_threshold}...")
-        result_name = f"result_z_threshold_{z_threshold}.csv"
-        subprocess.run(['python3', 'main.py', os.path.join(results_dir, result_name), "backtest_results/json/z_threshold.json"])
-
-        time.sleep(1)
-
-    # 测试 time_length_days 参数
-    for time_length in time_length_days_values:
-        config['strategy']['window'] = default_params['window']
-        config['strategy']['z_threshold'] = default_params['z_threshold']
-        config['data']['time_length_days'] = time_length
-        config['data']['training_threshold'] = default_params['training_threshold']
-
-        with open(config_file, 'w') as file:
-            yaml.dump(config, file)
-
-        print(f"Running backtest with time_length_days = {time_length}...")
-        result_name = f"result_time_length_{time_length}d.csv"
-        subprocess.run(['python3', 'main.py', os.path.join(results_dir, result_name), "backtest_results/json/time_length.json"])
-
-        time.sleep(1)
-
-    # 测试 training_threshold 参数
-    for training_threshold in training_threshold_values:
-        config['strategy']['window'] = default_params['window']
-        config['strategy']['z_threshold'] = default_params['z_threshold']
-        config['data']['time_length_days'] = default_params['time_length_days']
-        config['data']['training_threshold'] = training_threshold
-
-        with open(config_file, 'w') as file:
-            yaml.dump(config, file)
-
-        print(f"Running backtest with training_threshold = {training_threshold}...")
-        result_name = f"result_training_threshold_{training_threshold}.csv"
-        subprocess.run(['python3', 'main.py', os.path.join(results_dir, result_name), "backtest_results/json/threshold.json"])
-
-        time.sleep(1)
+    # 在同一个进程里运行所有回测，避免每次都重新启动解释器和改写 config.yaml
+    from main import sweep
+    from Utils.log_utils import setup_logging
+    setup_logging(config)
+    sweep(config, results_dir=results_dir)
 
     # print(f"Running backtest with all possibilities...")
     # for window in window_values:
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Backtesting.backtesting import Backtester
+from Backtesting.kernels import _accounting_many_numpy, run_accounting_many
+from RegressionModel.regression_model import RegressionModel
+from Strategy.strategy import PairTradingStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', 'commodity_data')
+
+
+@pytest.fixture(scope='module')
+def bars():
+    paths = [os.path.join(DATA_DIR, f'{symbol}_1min.json') for symbol in ('GLD', 'GDX')]
+    if not all(os.path.exists(path) for path in paths):
+        pytest.skip("cached GLD / GDX bars not available")
+    data = pd.concat([pd.read_json(path, orient='index') for path in paths], axis=1).dropna()
+    data.index = pd.to_datetime(data.index)
+    return data.iloc[-20000:]
+
+
+@pytest.mark.parametrize('model', ['OLS', 'Kalman'])
+def test_kernel_matches_loop(bars, model):
+    training, testing = bars.iloc[:-5000], bars.iloc[-5000:]
+    if model == 'Kalman':
+        hedge_ratio, alpha = RegressionModel(training).kalman_fit(bars)
+        hedge_ratio, alpha = hedge_ratio.loc[testing.index], alpha.loc[testing.index]
+    else:
+        hedge_ratio, alpha = RegressionModel(training).linear_fit()
+    signals = PairTradingStrategy(testing, hedge_ratio, alpha, z_threshold=1.5, window=30).generate_signals()
+
+    results = {}
+    for engine in ('loop', 'kernel'):
+        backtester = Backtester(testing, signals, hedge_ratio, alpha, initial_capital=100000, transaction_cost=0.0035)
+        results[engine] = backtester.run_backtest(engine=engine)
+    assert signals['positions'].diff().abs().sum() > 0
+    np.testing.assert_allclose(results['kernel'].to_numpy(), results['loop'].to_numpy(), rtol=0, atol=1e-6)
+
+
+def test_many_matches_single_sets(bars):
+    testing = bars.iloc[-5000:]
+    hedge_ratio, alpha = 1.5, 3.0
+    positions = np.vstack([
+        PairTradingStrategy(testing, hedge_ratio, alpha, z_threshold=1.5, window=window).generate_signals()['positions'].to_numpy()
+        for window in (10, 30, 60)
+    ])
+    many = run_accounting_many(testing['GLD'], testing['GDX'], positions, hedge_ratio, 100000, 0.0035)
+    reference = _accounting_many_numpy(testing['GLD'].to_numpy(), testing['GDX'].to_numpy(), positions,
+                                       np.full(positions.shape, hedge_ratio), 100000, 0.0035)
+    np.testing.assert_allclose(many, reference, rtol=0, atol=1e-6)
+